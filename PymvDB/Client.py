@@ -1,19 +1,29 @@
 import sqlite3
 from PIL import Image
-from .Collection import Collection, HTTPCollection
-import requests
+from .Collection import Collection, HTTPCollection, load_vector_extension, make_http_session
 from typing import Optional
 
 class HTTPclient:
     def __init__(self, server_url):
         self.server_url = server_url
+        # Shared with the collections created by this client, so that they reuse its connections
+        self.session = make_http_session()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def create_collection(self, Name):
         url = f"{self.server_url}/create_collection"
-        response = requests.post(url, json={"name": Name})
+        response = self.session.post(url, json={"name": Name})
         
         if response.status_code == 200 and response.json().get("message") == f"Collection '{Name}' created.":
-            return HTTPCollection(Name, self.server_url)
+            return HTTPCollection(Name, self.server_url, self.session)
         else:
             raise Exception(f"Failed to create collection: {response.json()}")
 
@@ -56,9 +66,12 @@ class Client:
 
     def _get_connection(self):
         """Returns a new SQLite connection."""
-        return sqlite3.connect(self.conn_str)
+        conn = sqlite3.connect(self.conn_str)
+        # vec0 tables can only be dropped with the extension loaded
+        load_vector_extension(conn)
+        return conn
 
-    def create_collection(self, name: str):
+    def create_collection(self, name: str, **kwargs):
         """
         Creates a new collection.
 
@@ -66,13 +79,15 @@ class Client:
         ----------
         name : str
             The name of the new collection.
+        **kwargs
+            Additional options forwarded to Collection (e.g. quantization).
 
         Returns
         -------
         Collection
             A new Collection object.
         """
-        return Collection(name, self.conn_str, self.embedding_model)
+        return Collection(name, self.conn_str, self.embedding_model, **kwargs)
 
     def reset_collection(self, collection: Collection):
         """
@@ -85,9 +100,8 @@ class Client:
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f'''
-            DROP TABLE IF EXISTS {collection.name}
-            ''')
+            cursor.execute(collection._sql_drop)
+            cursor.execute(collection._sql_drop_vec)
             conn.commit()
         collection._create_table()
 
@@ -97,8 +111,13 @@ class Client:
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            # Fetch all table names
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+            # Drop virtual tables first, as they also drop their own shadow tables
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND sql LIKE 'CREATE VIRTUAL TABLE%';")
+            for table in cursor.fetchall():
+                cursor.execute(f"DROP TABLE IF EXISTS {table[0]};")
+
+            # Fetch all remaining table names, skipping SQLite's internal ones
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
             tables = cursor.fetchall()
 
             # Drop each table
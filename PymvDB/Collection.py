@@ -1,11 +1,150 @@
 import sqlite3
 import numpy as np
 import base64
+import binascii
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 from .query_result import qresult
+from ._kernels import topk_cosine
+from ._ann import HNSW_BACKEND
 from PIL import Image
 import io
+import os
+import re
+import threading
+import warnings
+import hashlib
+import contextlib
+from collections import OrderedDict
+
+try:
+    import sqlite_vec
+except ImportError:
+    sqlite_vec = None
+
+try:
+    import blosc2
+except ImportError:
+    blosc2 = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def load_vector_extension(conn: sqlite3.Connection) -> bool:
+    """
+    Loads the sqlite-vec extension into a connection, if it is installed.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        The connection to load the extension into.
+
+    Returns
+    -------
+    bool
+        True if the extension was loaded, False otherwise.
+    """
+    if sqlite_vec is None:
+        return False
+    try:
+        conn.enable_load_extension(True)
+        sqlite_vec.load(conn)
+        conn.enable_load_extension(False)
+    except (AttributeError, sqlite3.OperationalError):
+        # Python builds without extension loading support lack enable_load_extension
+        return False
+    return True
+
+
+def image_cache_key(image: Image.Image) -> tuple:
+    """
+    Returns a key identifying the pixels of an image, for caching work done on it.
+
+    Parameters
+    ----------
+    image : PIL.Image.Image
+        The image.
+
+    Returns
+    -------
+    tuple
+        The mode, size and a digest of the pixel data of the image, including its
+        palette and transparency.
+    """
+    digest = hashlib.blake2b(image.tobytes(), digest_size=16)
+    # The pixels of palette images are indices, which mean nothing without the palette
+    palette = image.getpalette() if image.palette is not None else None
+    digest.update(bytes(palette or ()))
+    digest.update(repr(image.info.get('transparency')).encode())
+    return image.mode, image.size, digest.digest()
+
+
+class LRUCache:
+    """
+    A thread-safe mapping that keeps only its most recently used entries.
+
+    Attributes
+    ----------
+    maxsize : int
+        The maximum number of entries kept.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """
+        Parameters
+        ----------
+        maxsize : int, optional
+            The maximum number of entries kept (default is 128).
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the value stored under key, or None, marking it as recently used."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Stores a value under key, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+def make_http_session() -> requests.Session:
+    """
+    Creates a requests session that keeps connections to the server alive and retries failed requests.
+
+    Every endpoint is safe to retry: adding an image that is already stored is a no-op.
+
+    Returns
+    -------
+    requests.Session
+        The session.
+    """
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=None)
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class HTTPCollection:
     """
@@ -17,9 +156,13 @@ class HTTPCollection:
         The name of the collection.
     server_url : str
         The URL of the server.
+    session : requests.Session
+        The session used to send requests to the server.
 
     Methods
     -------
+    close()
+        Closes the connections to the server.
     add_image(image_path, metadata=None)
         Adds an image to the collection.
     find_similar_images(image_path, top_N=5, threshold=0.0, where=None)
@@ -30,7 +173,9 @@ class HTTPCollection:
         Converts a base64 string to an image.
     """
 
-    def __init__(self, Name, server_url):
+    JPEG_CACHE_SIZE = 32
+
+    def __init__(self, Name, server_url, session: requests.Session = None):
         """
         Parameters
         ----------
@@ -38,14 +183,33 @@ class HTTPCollection:
             The name of the collection.
         server_url : str
             The URL of the server.
+        session : requests.Session, optional
+            The session to send requests with, shared with the client that created the
+            collection. If None, the collection opens its own (default is None).
         """
         self.name = Name
         self.server_url = server_url
+        self.session = session if session is not None else make_http_session()
+        # JPEG encodings of recent query images, keyed by image_cache_key
+        self._jpeg_cache = LRUCache(self.JPEG_CACHE_SIZE)
+
+    def close(self):
+        """Closes the connections to the server."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def add_image(self, image_path: str, metadata: dict = None):
         """
         Adds an image to the collection.
 
+        The image file is uploaded as is in a multipart request, rather than base64
+        encoded in a JSON body.
+
         Parameters
         ----------
         image_path : str
@@ -56,17 +220,14 @@ class HTTPCollection:
         if metadata is None:
             metadata = {}
 
-        with open(image_path, "rb") as image_file:
-            image_base64 = base64.b64encode(image_file.read()).decode('utf-8')
-
         url = f"{self.server_url}/add_image"
         data = {
             "collection": self.name,
             "file": image_path,
-            "image_base64": image_base64,
-            "metadata": metadata
+            "metadata": json.dumps(metadata)
         }
-        response = requests.post(url, json=data)
+        with open(image_path, "rb") as image_file:
+            response = self.session.post(url, data=data, files={"image": image_file})
         if response.status_code != 200:
             raise Exception(f"Failed to add image: {response.json()}")
 
@@ -90,27 +251,42 @@ class HTTPCollection:
         qresult
             A query result object containing the similar images and their details.
         """
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        image_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        key = image_cache_key(image)
+        jpeg = self._jpeg_cache.get(key)
+        if jpeg is None:
+            buffered = io.BytesIO()
+            image.save(buffered, format="JPEG")
+            jpeg = buffered.getvalue()
+            self._jpeg_cache.put(key, jpeg)
 
         url = f"{self.server_url}/find_similar"
         data = {
             "collection": self.name,
-            "image_base64": image_base64,
-            "top_N": top_N,
-            "threshold": threshold,
-            "where": where
+            "top_N": json.dumps(top_N),
+            "threshold": json.dumps(threshold),
+            "where": json.dumps(where)
         }
-        response = requests.post(url, json=data)
-        result = qresult(**response.json())
+        response = self.session.post(url, data=data, files={"image": ("image.jpg", jpeg, "image/jpeg")})
         if response.status_code != 200:
             raise Exception(f"Failed to find similar images: {response.json()}")
 
-        return result
+        return qresult(**response.json())
 
 class Collection:
-    def __init__(self, name, conn_str, embedding_model):
+    QUANTIZATIONS = ('int8', 'float16', 'float32')
+    INDEXES = ('flat', 'sqlite-vec', 'faiss', 'hnsw')
+    COMPRESSIONS = (None, 'blosc2')
+    SQLITE_VEC_MAX_K = 4096
+    MAX_META_COLUMNS = 64
+    MMAP_SIZE = 256 * 1024 * 1024
+    CACHE_SIZE_KIB = 64000
+    MAX_IDLE_CONNECTIONS = 8
+    SCAN_CHUNK_SIZE = 4096
+    ANN_THRESHOLD = 10000
+    QUERY_CACHE_SIZE = 128
+    DRAFT_SIZE = (224, 224)
+
+    def __init__(self, name, conn_str, embedding_model, quantization='int8', index='flat', compression=None):
         """
         Parameters
         ----------
@@ -119,31 +295,273 @@ class Collection:
         conn_str : str
             The SQLite connection string.
         embedding_model : callable
-            The model used to generate embeddings from images.
+            The model used to generate embeddings from images. If it also has a
+            batch(images) method returning an array of shape (len(images), D),
+            add_images uses it to embed images in batches.
+        quantization : str, optional
+            The storage format of new vectors, one of 'int8' (one float32 scale followed
+            by D int8 values), 'float16' or 'float32' (default is 'int8').
+        index : str, optional
+            The search backend, one of 'flat' (brute force over an in-memory matrix),
+            'sqlite-vec' (KNN inside SQLite through a vec0 virtual table), 'faiss'
+            (brute force through a FAISS IndexFlatIP kept next to the matrix) or 'hnsw'
+            (approximate search through a usearch, or else FAISS, HNSW graph once the
+            collection holds more than ANN_THRESHOLD vectors, saved next to the database
+            file). Backends
+            that are not installed fall back to 'flat' (default is 'flat').
+        compression : str, optional
+            The compression of new vector BLOBs, either None or 'blosc2' (zstd with byte
+            shuffle). A vector is only stored compressed when that makes it smaller
+            (default is None).
         """
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+            raise ValueError(f"Invalid collection name '{name}', expected letters, digits and underscores")
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}', expected one of {self.QUANTIZATIONS}")
+        if index not in self.INDEXES:
+            raise ValueError(f"Unknown index '{index}', expected one of {self.INDEXES}")
+        if compression not in self.COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {self.COMPRESSIONS}")
+        if compression == 'blosc2' and blosc2 is None:
+            warnings.warn("blosc2 is not installed, vectors will be stored uncompressed")
+            compression = None
+        if index == 'sqlite-vec' and not load_vector_extension(sqlite3.connect(':memory:')):
+            warnings.warn("sqlite-vec is not available, falling back to the 'flat' index")
+            index = 'flat'
+        if index == 'faiss' and faiss is None:
+            warnings.warn("faiss is not installed, falling back to the 'flat' index")
+            index = 'flat'
+        if index == 'hnsw' and HNSW_BACKEND is None:
+            warnings.warn("neither usearch nor faiss is installed, falling back to the 'flat' index")
+            index = 'flat'
         self.name = name
         self.conn_str = conn_str
         self.embedding_model = embedding_model
+        self.quantization = quantization
+        self.index = index
+        self.compression = compression
+        self._tls = threading.local()
+        self._connections = []
+        self._idle_connections = []
+        self._connections_lock = threading.Lock()
+        # Every connection to ':memory:' opens a separate, empty database, so an
+        # in-memory collection keeps a single connection, used by one thread at a time
+        self._memory_lock = threading.Lock() if conn_str == ':memory:' else None
+        # The data_version each connection returned when the matrix, and the
+        # sqlite-vec table, were last checked
+        self._data_versions = {}
+        self._vec_data_versions = {}
+        self.vec_table = f"{name}_vec"
+        self._meta_columns = {}
+        self._matrix = None
+        self._ids = None
+        self._size = 0
+        # Bumped whenever the matrix changes, so that the HNSW index is only
+        # reconciled with it when needed
+        self._matrix_version = 0
+        self._faiss = None
+        self._ann = None
+        self._ann_dirty = False
+        self._ann_version = None
+        # Bumped by _reset_ann, so that a graph built from rows that were since dropped
+        # is thrown away
+        self._ann_resets = 0
+        # Held while a graph is built or reconciled, which is done outside the matrix lock
+        self._ann_build_lock = threading.Lock()
+        self._ann_path = None
+        if HNSW_BACKEND is not None and conn_str != ':memory:':
+            self._ann_path = f"{conn_str}.{name}.{HNSW_BACKEND.SUFFIX}"
+        self._matrix_lock = threading.RLock()
+        # Normalized embeddings of recent query images, keyed by image_cache_key
+        self._query_cache = LRUCache(self.QUERY_CACHE_SIZE)
+        self._build_statements()
         self._create_table()
+        if index == 'hnsw':
+            self._sync_ann()
+
+    def _build_statements(self):
+        """
+        Builds the SQL statements used on the insert and query paths once.
 
+        Reusing the exact same text lets sqlite3's statement cache skip parsing and
+        planning them again. The table name is validated in __init__, which makes it
+        safe to embed.
+        """
+        name, vec_table = self.name, self.vec_table
+        self._sql_create = '''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            image_bytes BLOB NOT NULL,
+            image_file_name TEXT NOT NULL UNIQUE,
+            vector BLOB NOT NULL,
+            metadata TEXT,
+            normalized INTEGER NOT NULL DEFAULT 1,
+            quant_kind TEXT NOT NULL DEFAULT 'float32',
+            vector_codec TEXT NOT NULL DEFAULT 'raw'
+        )
+        '''
+        self._sql_drop = f"DROP TABLE IF EXISTS {name}"
+        self._sql_drop_vec = f"DROP TABLE IF EXISTS {vec_table}"
+        self._sql_count = f"SELECT COUNT(*) FROM {name}"
+        self._sql_count_max = f"SELECT COUNT(*), MAX(id) FROM {name}"
+        self._sql_max_id = f"SELECT COALESCE(MAX(id), 0) FROM {name}"
+        self._sql_insert = f'''
+        INSERT OR IGNORE INTO {name}
+        (image_bytes, image_file_name, vector, metadata, normalized, quant_kind, vector_codec)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+        '''
+        self._sql_select_new = f"SELECT id, image_file_name FROM {name} WHERE id > ? ORDER BY id"
+        self._sql_select_vectors = f'''
+        SELECT id, vector, normalized, quant_kind, vector_codec FROM {name} ORDER BY id
+        '''
+        self._sql_select_all = f'''
+        SELECT image_bytes, image_file_name, metadata FROM {name} ORDER BY id
+        '''
+        self._sql_fetch_rows = f'''
+        SELECT id, image_bytes, image_file_name, metadata FROM {name} WHERE id IN ({{}})
+        '''
+        self._sql_insert_vec = f"INSERT INTO {vec_table} (rowid, embedding) VALUES (?, ?)"
+        self._sql_delete_orphan_vecs = f'''
+        DELETE FROM {vec_table} WHERE rowid NOT IN (SELECT id FROM {name})
+        '''
+        self._sql_select_missing_vecs = f'''
+        SELECT id, vector, normalized, quant_kind, vector_codec FROM {name}
+        WHERE id NOT IN (SELECT rowid FROM {vec_table})
+        '''
+        self._sql_knn = f'''
+        WITH knn AS MATERIALIZED (
+            SELECT rowid, distance FROM {vec_table} WHERE embedding MATCH ? AND k = ?
+        )
+        SELECT c.id, knn.distance, COUNT(*) OVER ()
+        FROM knn JOIN {name} c ON c.id = knn.rowid
+        WHERE knn.distance <= ?{{where}}
+        ORDER BY knn.distance
+        LIMIT ?
+        '''
+        self._sql_filter_ids = f"SELECT c.id FROM {name} c WHERE 1 = 1{{where}}"
+
+    @contextlib.contextmanager
     def _get_connection(self):
-        """Returns a new SQLite connection."""
-        return sqlite3.connect(self.conn_str)
+        """
+        Checks out a pooled SQLite connection for the calling thread, within a transaction.
+
+        Nested calls on the same thread share the same connection. Connections are
+        returned to the pool afterwards rather than being tied to a thread, as the
+        HTTP server runs each request on a new thread; at most MAX_IDLE_CONNECTIONS
+        are kept open between uses. An in-memory collection has a single connection,
+        which threads wait for in turn.
+        """
+        conn = getattr(self._tls, 'conn', None)
+        if conn is not None:
+            with conn:
+                yield conn
+            return
+        conn = self._acquire_connection()
+        self._tls.conn = conn
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._tls.conn = None
+            self._release_connection(conn)
+
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """Takes an idle connection from the pool, or opens a new one."""
+        if self._memory_lock is not None:
+            self._memory_lock.acquire()
+            with self._connections_lock:
+                if self._connections:
+                    return self._connections[0]
+        with self._connections_lock:
+            if self._idle_connections:
+                return self._idle_connections.pop()
+        # check_same_thread is off as connections move between threads; each one
+        # is still only used by one thread at a time.
+        conn = sqlite3.connect(self.conn_str, check_same_thread=False)
+        # Safe with WAL (only the last commits can be lost on power failure) and
+        # avoids an fsync per transaction
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # A negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size=-{self.CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={self.MMAP_SIZE}")
+        if self.index == 'sqlite-vec':
+            load_vector_extension(conn)
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _release_connection(self, conn: sqlite3.Connection):
+        """Returns a connection to the pool, or closes it if the pool is full or was closed."""
+        if self._memory_lock is not None:
+            # Closing it would discard the database
+            self._memory_lock.release()
+            return
+        with self._connections_lock:
+            if conn in self._connections:
+                if len(self._idle_connections) < self.MAX_IDLE_CONNECTIONS:
+                    self._idle_connections.append(conn)
+                    return
+                self._connections.remove(conn)
+        with self._matrix_lock:
+            self._data_versions.pop(conn, None)
+            self._vec_data_versions.pop(conn, None)
+        conn.close()
+
+    def close(self):
+        """
+        Closes the SQLite connections opened by the collection, and saves its HNSW index.
+
+        A collection stored in a file can still be used afterwards, as new connections
+        are opened on demand. An in-memory collection is discarded along with its
+        connection, and cannot be used afterwards.
+        """
+        with self._matrix_lock:
+            self._save_ann()
+            self._data_versions.clear()
+            self._vec_data_versions.clear()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._idle_connections = []
+        for conn in connections:
+            conn.close()
 
     def _create_table(self):
         """Creates the SQLite table for the collection if it does not exist."""
+        self._invalidate_matrix()
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS {self.name} (
-                id INTEGER PRIMARY KEY,
-                image_base64 TEXT NOT NULL,
-                image_file_name TEXT NOT NULL UNIQUE,
-                vector BLOB NOT NULL,
-                metadata TEXT
-            )
-            ''')
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.name,))
+            is_new = cursor.fetchone() is None
+            # The journal mode is persistent, so it only needs to be set once per database
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(self._sql_create.format(table=self.name))
+            cursor.execute(f"PRAGMA table_xinfo({self.name})")
+            columns = {row[1] for row in cursor.fetchall()}
+            self._meta_columns = {column[len('meta_'):]: column for column in columns if column.startswith('meta_')}
+            if 'normalized' not in columns:
+                # Tables created before vectors were normalized at insert time: flag
+                # their rows, then normalize them once. Rows inserted later by older
+                # versions also get the flag, and are renormalized when read back.
+                cursor.execute(f'''
+                ALTER TABLE {self.name} ADD COLUMN normalized INTEGER NOT NULL DEFAULT 0
+                ''')
+                self._normalize_legacy_rows(cursor)
+            if 'quant_kind' not in columns:
+                cursor.execute(f'''
+                ALTER TABLE {self.name} ADD COLUMN quant_kind TEXT NOT NULL DEFAULT 'float32'
+                ''')
+            if 'vector_codec' not in columns:
+                cursor.execute(f'''
+                ALTER TABLE {self.name} ADD COLUMN vector_codec TEXT NOT NULL DEFAULT 'raw'
+                ''')
+            if 'image_base64' in columns:
+                self._migrate_base64_images(cursor, 'image_bytes' in columns)
+            if self.index == 'sqlite-vec':
+                self._sync_vec_table(cursor)
             conn.commit()
+        # A graph saved for a table that was dropped holds ids that new rows will reuse
+        self._reset_ann(delete_saved=is_new)
 
     def add_image(self, image_path: str, metadata: dict = None):
         """
@@ -158,37 +576,526 @@ class Collection:
         """
         if metadata is None:
             metadata = {}
-        image = Image.open(image_path)
-        image_base64 = self.image_file_to_base64(image_path)
+        image_data, image = self._read_image(image_path)
         vector = self.embedding_model(image)
-        self.add_image_vector(image_path, image_base64, vector, metadata)
+        self.add_image_vector(image_path, image_data, vector, metadata)
+
+    def _read_image(self, image_path: str):
+        """
+        Reads an image file once, for both storage and embedding.
+
+        JPEG images are decoded in draft mode, which lets libjpeg scale them down
+        while decoding, to the smallest size that is still at least DRAFT_SIZE
+        (when DRAFT_SIZE is not None).
+
+        Parameters
+        ----------
+        image_path : str
+            The path to the image file.
+
+        Returns
+        -------
+        image_data : bytes
+            The raw bytes of the file.
+        image : PIL.Image.Image
+            The decoded image.
+        """
+        with open(image_path, "rb") as image_file:
+            image_data = image_file.read()
+        image = Image.open(io.BytesIO(image_data))
+        if self.DRAFT_SIZE is not None:
+            # A no-op for formats other than JPEG
+            image.draft('RGB', self.DRAFT_SIZE)
+        image.load()
+        return image_data, image
 
-    def add_image_vector(self, path: str, image_base64: str, vector: np.ndarray, metadata: dict):
+    def _normalize_legacy_rows(self, cursor):
+        """
+        Rewrites the vectors of rows flagged as not normalized as unit vectors.
+
+        Parameters
+        ----------
+        cursor : sqlite3.Cursor
+            The cursor used to update the table.
+        """
+        last_id = 0
+        while True:
+            cursor.execute(f'''
+            SELECT id, vector, normalized, 'float32', 'raw' FROM {self.name}
+            WHERE normalized = 0 AND id > ? ORDER BY id LIMIT ?
+            ''', (last_id, self.SCAN_CHUNK_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            vectors = self._decode_rows(rows)
+            cursor.executemany(f"UPDATE {self.name} SET vector = ?, normalized = 1 WHERE id = ?", [
+                (vector.tobytes(), row[0]) for row, vector in zip(rows, vectors)
+            ])
+            last_id = rows[-1][0]
+
+    def _migrate_base64_images(self, cursor, has_bytes_column: bool):
+        """
+        Converts a table that stores base64 images into one that stores raw image bytes.
+
+        Parameters
+        ----------
+        cursor : sqlite3.Cursor
+            The cursor used to alter the table.
+        has_bytes_column : bool
+            Whether a previous, interrupted migration already added the image_bytes column.
+        """
+        if not has_bytes_column:
+            cursor.execute(f"ALTER TABLE {self.name} ADD COLUMN image_bytes BLOB NOT NULL DEFAULT x''")
+        last_id = 0
+        while True:
+            cursor.execute(f'''
+            SELECT id, image_base64 FROM {self.name} WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, self.SCAN_CHUNK_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(f"UPDATE {self.name} SET image_bytes = ? WHERE id = ?", [
+                (base64.b64decode(image_base64), row_id) for row_id, image_base64 in rows
+            ])
+            last_id = rows[-1][0]
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            cursor.execute(f"ALTER TABLE {self.name} DROP COLUMN image_base64")
+            return
+        # DROP COLUMN is not supported before SQLite 3.35, and the NOT NULL
+        # image_base64 column cannot be kept, so the table is rebuilt without it
+        migrated = f"{self.name}_migrated"
+        columns = "id, image_bytes, image_file_name, vector, metadata, normalized, quant_kind, vector_codec"
+        cursor.execute(f"DROP TABLE IF EXISTS {migrated}")
+        cursor.execute(self._sql_create.format(table=migrated))
+        cursor.execute(f"INSERT INTO {migrated} ({columns}) SELECT {columns} FROM {self.name}")
+        cursor.execute(f"DROP TABLE {self.name}")
+        cursor.execute(f"ALTER TABLE {migrated} RENAME TO {self.name}")
+        # Generated metadata columns are not carried over; they are added back on insert
+        self._meta_columns = {}
+
+    def add_images(self, image_paths: list, metadatas: list = None, batch_size: int = 32):
+        """
+        Adds several images to the collection in a single transaction.
+
+        Images are embedded batch_size at a time when the embedding model has a
+        batch method, and one by one otherwise.
+
+        Parameters
+        ----------
+        image_paths : list of str
+            The paths to the image files.
+        metadatas : list of dict, optional
+            The metadata associated with each image (default is None).
+        batch_size : int, optional
+            The number of images per call to the embedding model (default is 32).
+        """
+        if metadatas is None:
+            metadatas = [{}] * len(image_paths)
+        if len(metadatas) != len(image_paths):
+            raise ValueError(f"Got {len(metadatas)} metadata entries for {len(image_paths)} images")
+        embed_batch = getattr(self.embedding_model, 'batch', None)
+        rows = []
+        for start in range(0, len(image_paths), batch_size):
+            paths = image_paths[start:start + batch_size]
+            image_datas, images = zip(*(self._read_image(image_path) for image_path in paths))
+            if embed_batch is not None:
+                vectors = np.asarray(embed_batch(list(images)), dtype=np.float32).reshape(len(images), -1)
+            else:
+                vectors = [self.embedding_model(image) for image in images]
+            batch = zip(paths, image_datas, vectors, metadatas[start:start + batch_size])
+            for image_path, image_data, vector, metadata in batch:
+                rows.append(self._prepare_row(image_path, image_data, vector, metadata or {}))
+        self._insert_rows(rows)
+
+    def add_image_vector(self, path: str, image_data: bytes, vector: np.ndarray, metadata: dict):
         """
         Adds an image vector to the collection.
 
+        The vector is L2-normalized before being stored, so that cosine similarity
+        at query time reduces to a plain dot product, then encoded according to the
+        collection's quantization.
+
         Parameters
         ----------
         path : str
             The file path of the image.
-        image_base64 : str
-            The base64 encoded string of the image.
+        image_data : bytes or str
+            The raw bytes of the image file. A str is taken as the base64 encoded image.
         vector : np.ndarray
             The embedding vector of the image.
         metadata : dict
             The metadata associated with the image.
         """
-        vector_blob = np.array(vector).tobytes()
-        metadata_json = json.dumps(metadata)
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute(f'''
-                INSERT INTO {self.name} (image_base64, image_file_name, vector, metadata) VALUES (?, ?, ?, ?)
-                ''', (image_base64, path, vector_blob, metadata_json))
+        if isinstance(image_data, str):
+            image_data = base64.b64decode(image_data)
+        self._insert_rows([self._prepare_row(path, image_data, vector, metadata)])
+
+    def _prepare_row(self, path: str, image_data: bytes, vector: np.ndarray, metadata: dict):
+        """
+        Normalizes and encodes a vector, ready to be inserted.
+
+        Parameters
+        ----------
+        path : str
+            The file path of the image.
+        image_data : bytes
+            The raw bytes of the image file.
+        vector : np.ndarray
+            The embedding vector of the image.
+        metadata : dict
+            The metadata associated with the image.
+
+        Returns
+        -------
+        tuple
+            The path, image bytes, vector BLOB, decoded stored vector, metadata and
+            vector codec.
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        vector = vector / (np.linalg.norm(vector) + 1e-12)
+        vector_blob = self._encode_vector(vector)
+        if self.quantization == 'float32':
+            stored = vector
+        else:
+            stored = self._decode_vectors([vector_blob], [self.quantization])[0]
+        codec = 'raw'
+        if self.compression == 'blosc2':
+            compressed = blosc2.compress(
+                vector_blob,
+                typesize={'int8': 1, 'float16': 2, 'float32': 4}[self.quantization],
+                codec=blosc2.Codec.ZSTD,
+                filter=blosc2.Filter.SHUFFLE,
+            )
+            if len(compressed) < len(vector_blob):
+                vector_blob, codec = compressed, 'blosc2'
+        return path, image_data, vector_blob, stored, metadata, codec
+
+    def _insert_rows(self, rows: list):
+        """
+        Inserts prepared rows with a single executemany and commit.
+
+        Rows whose file name is already in the collection are ignored.
+
+        Parameters
+        ----------
+        rows : list of tuple
+            The rows returned by _prepare_row.
+        """
+        if not rows:
+            return
+        # The matrix lock is held from before the commit until the rows are appended,
+        # so that no query can load the new rows into the matrix in between
+        with self._matrix_lock:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                if not conn.in_transaction:
+                    # Take the write lock before reading MAX(id), so that no other
+                    # connection can insert rows between that read and the insert
+                    cursor.execute("BEGIN IMMEDIATE")
+                for row in rows:
+                    self._add_meta_columns(cursor, row[4])
+                cursor.execute(self._sql_max_id)
+                last_id = cursor.fetchone()[0]
+                cursor.executemany(self._sql_insert, [
+                    (row[1], row[0], row[2], json.dumps(row[4]), self.quantization, row[5]) for row in rows
+                ])
+                # New rows get ids above the previous maximum; ignored duplicates do not
+                cursor.execute(self._sql_select_new, (last_id,))
+                stored = {}
+                for row in rows:
+                    stored.setdefault(row[0], row[3])
+                inserted = [(row_id, stored[path]) for row_id, path in cursor.fetchall()]
+                if self.index == 'sqlite-vec' and inserted:
+                    self._create_vec_table(cursor, inserted[0][1].size)
+                    cursor.executemany(self._sql_insert_vec, [(row_id, vector.tobytes()) for row_id, vector in inserted])
                 conn.commit()
-            except sqlite3.IntegrityError:
-                pass
+            ann_synced = self._ann is not None and self._ann_version == self._matrix_version
+            if self._matrix is not None:
+                for row_id, vector in inserted:
+                    self._append_to_matrix(row_id, vector)
+            if self._ann is not None:
+                for row_id, vector in inserted:
+                    if vector.size == self._ann.ndim:
+                        self._ann.add(row_id, vector)
+                        self._ann_dirty = True
+                if ann_synced and self._matrix is not None:
+                    self._ann_version = self._matrix_version
+            build_ann = (self.index == 'hnsw' and self._size > self.ANN_THRESHOLD
+                         and self._ann_version != self._matrix_version)
+        if build_ann:
+            # Another thread already building the graph adds these rows once it is done
+            self._sync_ann(wait=False)
+
+    def _encode_vector(self, vector: np.ndarray):
+        """
+        Serializes a vector into a BLOB using the collection's quantization.
+
+        Parameters
+        ----------
+        vector : np.ndarray
+            The contiguous float32 vector to encode.
+
+        Returns
+        -------
+        bytes or memoryview
+            The encoded vector. Float32 vectors are returned as a view of their
+            buffer, which sqlite3 binds as a BLOB without an intermediate copy.
+        """
+        if self.quantization == 'int8':
+            peak = np.max(np.abs(vector)) if vector.size else 0.0
+            if peak == 0:
+                return np.float32(0.0).tobytes() + np.zeros(vector.size, dtype=np.int8).tobytes()
+            quantized = np.round(vector * (127.0 / peak)).astype(np.int8)
+            # Pick the scale that preserves the vector norm, so that dequantized
+            # unit vectors stay unit vectors.
+            scale = np.float32(np.linalg.norm(vector) / np.linalg.norm(quantized.astype(np.float32)))
+            return scale.tobytes() + quantized.tobytes()
+        if self.quantization == 'float16':
+            return vector.astype(np.float16).tobytes()
+        return memoryview(vector).cast('B')
+
+    def _decode_vectors(self, blobs: list, quant_kinds: list) -> np.ndarray:
+        """
+        Decodes stored vector BLOBs into a single float32 matrix.
+
+        Quantized rows are dequantized here so that similarity is computed with a
+        float32 BLAS product; NumPy has no BLAS path for int8 matrices.
+
+        Parameters
+        ----------
+        blobs : list of bytes
+            The encoded vectors.
+        quant_kinds : list of str
+            The quantization of each BLOB.
+
+        Returns
+        -------
+        np.ndarray
+            The decoded vectors, of shape (N, D).
+        """
+        kinds = set(quant_kinds)
+        vectors = None
+        for kind in kinds:
+            rows = [i for i, k in enumerate(quant_kinds) if k == kind]
+            if kind == 'int8':
+                scales = np.frombuffer(b''.join(blobs[i][:4] for i in rows), dtype=np.float32)
+                block = np.frombuffer(b''.join(blobs[i][4:] for i in rows), dtype=np.int8)
+                block = block.reshape(len(rows), -1).astype(np.float32) * scales[:, None]
+            elif kind == 'float16':
+                block = np.frombuffer(b''.join(blobs[i] for i in rows), dtype=np.float16)
+                block = block.reshape(len(rows), -1).astype(np.float32)
+            else:
+                # Joined into a bytearray so that the matrix is writable without a copy
+                block = np.frombuffer(bytearray().join(blobs[i] for i in rows), dtype=np.float32)
+                block = block.reshape(len(rows), -1)
+            if len(kinds) == 1:
+                return block
+            if vectors is None:
+                vectors = np.empty((len(blobs), block.shape[1]), dtype=np.float32)
+            vectors[rows] = block
+        return vectors
+
+    @staticmethod
+    def _decompress(blob: bytes, codec: str) -> bytes:
+        """
+        Undoes the compression of a stored vector BLOB.
+
+        Parameters
+        ----------
+        blob : bytes
+            The stored BLOB.
+        codec : str
+            The codec the BLOB was stored with.
+
+        Returns
+        -------
+        bytes
+            The uncompressed BLOB.
+        """
+        if codec == 'raw':
+            return blob
+        if codec == 'blosc2':
+            if blosc2 is None:
+                raise ImportError("blosc2 is required to read vectors compressed with blosc2")
+            return blosc2.decompress(blob)
+        raise ValueError(f"Unknown vector codec '{codec}'")
+
+    def _decode_rows(self, rows: list) -> np.ndarray:
+        """
+        Decodes (id, vector, normalized, quant_kind, vector_codec) rows into a normalized float32 matrix.
+
+        Parameters
+        ----------
+        rows : list of tuple
+            The rows read from the collection table.
+
+        Returns
+        -------
+        np.ndarray
+            The L2-normalized vectors, of shape (N, D).
+        """
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        blobs = [self._decompress(row[1], row[4]) for row in rows]
+        vectors = self._decode_vectors(blobs, [row[3] for row in rows])
+        legacy = np.array([not row[2] for row in rows])
+        if legacy.any():
+            vectors[legacy] /= np.linalg.norm(vectors[legacy], axis=1, keepdims=True) + 1e-12
+        return vectors
+
+    def _vec_table_exists(self, cursor) -> bool:
+        """Returns whether the sqlite-vec table of the collection exists."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (self.vec_table,))
+        return cursor.fetchone() is not None
+
+    def _create_vec_table(self, cursor, dim: int):
+        """
+        Creates the sqlite-vec table mirroring the collection vectors if it does not exist.
+
+        Parameters
+        ----------
+        cursor : sqlite3.Cursor
+            The cursor used to create the table.
+        dim : int
+            The dimension of the vectors.
+        """
+        cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {self.vec_table} USING vec0(
+            embedding float[{int(dim)}] distance_metric=cosine
+        )
+        ''')
+
+    def _sync_vec_table(self, cursor):
+        """
+        Brings the sqlite-vec table in line with the collection table.
+
+        Rows written without the extension (or before the table existed) are added,
+        and rows deleted from the collection table are removed.
+
+        Parameters
+        ----------
+        cursor : sqlite3.Cursor
+            The cursor used to read and write the tables.
+        """
+        exists = self._vec_table_exists(cursor)
+        if exists:
+            cursor.execute(self._sql_delete_orphan_vecs)
+            cursor.execute(self._sql_select_missing_vecs)
+        else:
+            cursor.execute(self._sql_select_vectors)
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        vectors = self._decode_rows(rows)
+        if not exists:
+            self._create_vec_table(cursor, vectors.shape[1])
+        cursor.executemany(self._sql_insert_vec, [(row[0], vector.tobytes()) for row, vector in zip(rows, vectors)])
+
+    def _invalidate_matrix(self):
+        """Drops the in-memory vector matrix so that it is reloaded on next use."""
+        with self._matrix_lock:
+            self._matrix = None
+            self._ids = None
+            self._size = 0
+            self._matrix_version += 1
+            self._faiss = None
+
+    def _load_matrix(self, cursor):
+        """
+        Loads every stored vector into a single contiguous float32 matrix.
+
+        Parameters
+        ----------
+        cursor : sqlite3.Cursor
+            The cursor used to read the table.
+        """
+        cursor.execute(self._sql_count)
+        capacity = cursor.fetchone()[0]
+        cursor.execute(self._sql_select_vectors)
+        self._invalidate_matrix()
+        matrix = None
+        ids = np.empty(capacity, dtype=np.int64)
+        size = 0
+        while True:
+            rows = cursor.fetchmany(self.SCAN_CHUNK_SIZE)
+            if not rows:
+                break
+            vectors = self._decode_rows(rows)
+            if matrix is None:
+                matrix = np.empty((max(capacity, len(rows)), vectors.shape[1]), dtype=np.float32)
+            if size + len(rows) > len(matrix):
+                # Rows were added between the count and the scan
+                matrix = np.resize(matrix, (size + len(rows), matrix.shape[1]))
+                ids = np.resize(ids, size + len(rows))
+            matrix[size:size + len(rows)] = vectors
+            ids[size:size + len(rows)] = [row[0] for row in rows]
+            size += len(rows)
+        self._matrix = matrix if matrix is not None else np.empty((0, 0), dtype=np.float32)
+        self._ids = ids
+        self._size = size
+        if self.index == 'faiss' and size:
+            self._faiss = faiss.IndexFlatIP(self._matrix.shape[1])
+            self._faiss.add(self._matrix[:size])
+
+    def _append_to_matrix(self, row_id: int, vector: np.ndarray):
+        """
+        Appends a vector to the in-memory matrix, doubling its capacity when full.
+
+        Parameters
+        ----------
+        row_id : int
+            The id of the row the vector was stored in.
+        vector : np.ndarray
+            The decoded, normalized vector.
+        """
+        if self._size == 0 or self._matrix.shape[1] != vector.size:
+            if self._size:
+                # Dimension changed: let the next query reload from the table.
+                self._invalidate_matrix()
+                return
+            self._matrix = np.empty((1, vector.size), dtype=np.float32)
+            self._ids = np.empty(1, dtype=np.int64)
+        elif self._size == len(self._matrix):
+            capacity = 2 * len(self._matrix)
+            self._matrix = np.resize(self._matrix, (capacity, self._matrix.shape[1]))
+            self._ids = np.resize(self._ids, capacity)
+        self._matrix[self._size] = vector
+        self._ids[self._size] = row_id
+        self._size += 1
+        self._matrix_version += 1
+        if self.index == 'faiss':
+            if self._faiss is None:
+                self._faiss = faiss.IndexFlatIP(vector.size)
+            self._faiss.add(self._matrix[self._size - 1:self._size])
+
+    def _get_matrix(self):
+        """
+        Returns the cached vector matrix, reloading it if the table changed behind it.
+
+        Inserts made through the collection update the matrix directly. Other writers
+        are detected by comparing the row count and maximum id with the matrix, which
+        is only done when SQLite's data_version shows that another connection has
+        committed since the last check, as COUNT(*) has to walk a whole index.
+
+        Returns
+        -------
+        ids : np.ndarray
+            The row ids of the vectors, in ascending order.
+        vectors : np.ndarray
+            The L2-normalized vectors, of shape (N, D).
+        """
+        with self._matrix_lock, self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA data_version")
+            data_version = cursor.fetchone()[0]
+            if self._matrix is None or data_version != self._data_versions.get(conn):
+                cursor.execute(self._sql_count_max)
+                count, max_id = cursor.fetchone()
+                cached_max_id = int(self._ids[self._size - 1]) if self._size else None
+                if self._matrix is None or count != self._size or max_id != cached_max_id:
+                    self._load_matrix(cursor)
+                self._data_versions[conn] = data_version
+            return self._ids[:self._size], self._matrix[:self._size]
 
     def get_all_vectors(self):
         """
@@ -200,27 +1107,32 @@ class Collection:
             The list of base64 encoded images.
         paths : list of str
             The list of image file paths.
-        vectors : list of np.ndarray
-            The list of embedding vectors.
+        vectors : np.ndarray
+            The L2-normalized embedding vectors stacked into a float32 matrix of shape (N, D).
         metadata : list of dict
             The list of metadata dictionaries.
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute(f'''
-            SELECT image_base64, image_file_name, vector, metadata FROM {self.name}
-            ''')
+            cursor.execute(self._sql_select_all)
             rows = cursor.fetchall()
-            files = [row[0] for row in rows]
-            paths = [row[1] for row in rows]
-            vectors = [np.frombuffer(row[2], dtype=np.float32) for row in rows]
-            metadata = [json.loads(row[3]) for row in rows]
-            return files, paths, vectors, metadata
+        files = [self._to_base64(row[0]) for row in rows]
+        paths = [row[1] for row in rows]
+        vectors = self._get_matrix()[1]
+        metadata = [json.loads(row[2]) for row in rows]
+        return files, paths, vectors, metadata
 
     def find_similar_images(self, target_image, top_N=5, threshold=0.0, where=None):
         """
         Finds similar images in the collection.
 
+        Stored vectors are unit length, so the cosine similarities against all of
+        them are computed with a single matrix-vector product, and only the top_N
+        best matches are sorted. With the 'faiss' index, the scan is done by FAISS,
+        and with the 'sqlite-vec' index, the KNN search runs inside SQLite instead.
+        With the 'hnsw' index, unfiltered queries on large collections are answered
+        approximately from the HNSW graph.
+
         Parameters
         ----------
         target_image : Image.Image
@@ -237,51 +1149,504 @@ class Collection:
         qresult
             A query result object containing the similar images and their details.
         """
-        target_vector = self.embedding_model(target_image)
-        base64s, paths, vectors, metadata = self.get_all_vectors()
-        similarities = [self.calculate_cosine_similarity(target_vector, vec) for vec in vectors]
-        
-        similar_images = [
-            (paths[i], base64s[i], similarities[i], metadata[i])
-            for i in range(len(vectors))
-            if similarities[i] >= threshold and self._metadata_matches(metadata[i], where)
-        ]
-        similar_images.sort(key=lambda x: x[2], reverse=True)
-        
-        top_similar_images = similar_images[:top_N]
-        
+        q = self._embed_query(target_image)
+        if self.index == 'hnsw' and where is None:
+            result = self._find_similar_hnsw(q, top_N, threshold)
+            if result is not None:
+                return result
+        if self.index == 'sqlite-vec' and top_N <= self.SQLITE_VEC_MAX_K:
+            result = self._find_similar_sqlite_vec(q, top_N, threshold, where)
+            if result is not None:
+                return result
+        if self.index == 'faiss':
+            ids, similarities = self._search_faiss(q, threshold)
+            candidates = np.arange(len(ids))
+            if where:
+                candidates = candidates[np.isin(ids, self._filter_ids(where))]
+            top = self._top_k(similarities, candidates, top_N)
+            scores, n_findings = similarities[top], len(ids)
+        else:
+            ids, vectors = self._get_matrix()
+            allowed = np.isin(ids, self._filter_ids(where)) if where else None
+            top, scores, n_findings = self._scan_matrix(vectors, q, threshold, top_N, allowed)
+        rows = self._fetch_rows(ids[top])
+
+        result = {
+            "n_findings": n_findings,
+            "scores": [float(score) for score in scores],
+            "files": [row[1] for row in rows],
+            "base64": [self._to_base64(row[0]) for row in rows],
+            "metadata": [json.loads(row[2]) for row in rows]
+        }
+
+        return qresult(**result)
+
+    def _embed_query(self, image: Image.Image) -> np.ndarray:
+        """
+        Returns the normalized embedding of a query image.
+
+        The embeddings of the last QUERY_CACHE_SIZE distinct images are cached, so that
+        querying again with the same image (e.g. with another filter or top_N) skips
+        the embedding model.
+
+        Parameters
+        ----------
+        image : PIL.Image.Image
+            The query image.
+
+        Returns
+        -------
+        np.ndarray
+            The L2-normalized float32 query vector, read-only.
+        """
+        key = image_cache_key(image)
+        q = self._query_cache.get(key)
+        if q is None:
+            q = np.asarray(self.embedding_model(image), dtype=np.float32).ravel()
+            q = q / np.linalg.norm(q)
+            q.setflags(write=False)
+            self._query_cache.put(key, q)
+        return q
+
+    def _scan_matrix(self, vectors: np.ndarray, q: np.ndarray, threshold: float, k: int, allowed: np.ndarray = None):
+        """
+        Scores every vector of the matrix against the query and selects the k best.
+
+        A fused Numba kernel is used when numba is installed, and a NumPy matrix
+        product otherwise.
+
+        Parameters
+        ----------
+        vectors : np.ndarray
+            The L2-normalized vectors, of shape (N, D).
+        q : np.ndarray
+            The normalized query vector.
+        threshold : float
+            The similarity threshold for filtering results.
+        k : int
+            The number of vectors to select.
+        allowed : np.ndarray, optional
+            A boolean mask of the vectors that may be selected (default is None, all vectors).
+
+        Returns
+        -------
+        top : np.ndarray
+            The positions of the selected vectors, in descending order of similarity.
+        scores : np.ndarray
+            The similarity of each selected vector.
+        n_findings : int
+            The number of vectors at or above the threshold.
+        """
+        found = topk_cosine(vectors, q, threshold, k, allowed)
+        if found is not None:
+            return found
+        if len(vectors):
+            similarities = vectors @ q
+        else:
+            similarities = np.empty(0, dtype=np.float32)
+        above_threshold = similarities >= threshold
+        mask = above_threshold if allowed is None else above_threshold & allowed
+        top = self._top_k(similarities, np.nonzero(mask)[0], k)
+        return top, similarities[top], int(np.count_nonzero(above_threshold))
+
+    def _search_faiss(self, q: np.ndarray, threshold: float):
+        """
+        Scores the collection through the FAISS index, keeping only the rows at or above threshold.
+
+        A range search is used rather than a top-k search, as n_findings needs the
+        number of rows above the threshold and not just the best ones.
+
+        Parameters
+        ----------
+        q : np.ndarray
+            The normalized query vector.
+        threshold : float
+            The similarity threshold for filtering results.
+
+        Returns
+        -------
+        ids : np.ndarray
+            The row ids of the matching vectors.
+        similarities : np.ndarray
+            The cosine similarity of each matching vector.
+        """
+        with self._matrix_lock:
+            ids = self._get_matrix()[0]
+            if self._faiss is None:
+                return ids[:0], np.empty(0, dtype=np.float32)
+            # FAISS keeps inner products strictly greater than the radius
+            radius = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+            _, similarities, positions = self._faiss.range_search(q.reshape(1, -1), radius)
+            return ids[positions], similarities
+
+    def _sync_ann(self, wait: bool = True):
+        """
+        Brings the HNSW index in line with the vector matrix, loading it from disk first.
+
+        Nothing is done while the collection holds ANN_THRESHOLD vectors or fewer.
+        Otherwise, the keys of the index are compared with the row ids, vectors missing
+        from the index are added to it, and the index is rebuilt if it holds vectors
+        that were deleted from the table or has the wrong dimension. This can take
+        a while, so it is done outside the matrix lock, on a snapshot of the matrix;
+        queries are answered by the exact scan meanwhile, and rows inserted meanwhile
+        are added once the index is in place.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for another thread already syncing the index, rather than
+            returning at once (default is True).
+        """
+        if not self._ann_build_lock.acquire(blocking=wait):
+            return
+        try:
+            with self._matrix_lock:
+                ids, vectors = self._get_matrix()
+                if len(ids) <= self.ANN_THRESHOLD:
+                    return
+                if self._ann is not None and self._ann_version == self._matrix_version:
+                    return
+                # Rows are only ever appended to the matrix, so the snapshot stays valid
+                ann, dirty, resets = self._ann, self._ann_dirty, self._ann_resets
+                self._ann, self._ann_dirty, self._ann_version = None, False, None
+            dim = vectors.shape[1]
+            if ann is None and self._ann_path is not None:
+                ann = HNSW_BACKEND.restore(self._ann_path)
+            present = None
+            if ann is not None and ann.ndim == dim:
+                present = ann.contains(ids)
+                # Keys of deleted rows can only be dropped by rebuilding the graph
+                if len(ann) != np.count_nonzero(present):
+                    present = None
+            if present is None:
+                ann = HNSW_BACKEND.create(dim)
+                present = np.zeros(len(ids), dtype=bool)
+            if not present.all():
+                ann.add(ids[~present], vectors[~present])
+                dirty = True
+            if dirty and self._ann_path is not None:
+                ann.save(self._ann_path)
+                dirty = False
+            with self._matrix_lock:
+                if self._ann_resets != resets:
+                    return
+                self._ann, self._ann_dirty = ann, dirty
+                if self._matrix is None:
+                    return
+                current = self._ids[:self._size]
+                if len(current) < len(ids) or not np.array_equal(current[:len(ids)], ids):
+                    # The matrix was reloaded since the snapshot: reconcile on next use
+                    return
+                if len(current) > len(ids) and self._matrix.shape[1] == dim:
+                    ann.add(current[len(ids):], self._matrix[len(ids):self._size])
+                    self._ann_dirty = True
+                self._ann_version = self._matrix_version
+        finally:
+            self._ann_build_lock.release()
+
+    def _reset_ann(self, delete_saved: bool = False):
+        """
+        Drops the in-memory HNSW index, so that it is restored or rebuilt on next use.
+
+        Parameters
+        ----------
+        delete_saved : bool, optional
+            Whether to also delete the index saved next to the database file (default is False).
+        """
+        with self._matrix_lock:
+            self._ann = None
+            self._ann_dirty = False
+            self._ann_version = None
+            self._ann_resets += 1
+            if delete_saved and self._ann_path is not None and os.path.exists(self._ann_path):
+                os.remove(self._ann_path)
+
+    def _save_ann(self):
+        """Writes the HNSW index next to the database file if it changed since it was loaded."""
+        if self._ann is not None and self._ann_dirty and self._ann_path is not None:
+            self._ann.save(self._ann_path)
+            self._ann_dirty = False
+
+    def _find_similar_hnsw(self, q: np.ndarray, top_N: int, threshold: float):
+        """
+        Runs an approximate search through the HNSW index.
+
+        Only the top_N approximate neighbours are scored, so n_findings counts those
+        above the threshold rather than every matching vector of the collection. The
+        index is synced first if the table changed behind it; while another thread
+        is doing so, the query is left to the exact scan.
+
+        Parameters
+        ----------
+        q : np.ndarray
+            The normalized query vector.
+        top_N : int
+            The number of top similar images to return.
+        threshold : float
+            The similarity threshold for filtering results.
+
+        Returns
+        -------
+        qresult or None
+            A query result object containing the similar images and their details, or
+            None if the collection is small enough to be searched exactly, or the index
+            is being synced by another thread.
+        """
+        with self._matrix_lock:
+            ids = self._get_matrix()[0]
+            if len(ids) <= self.ANN_THRESHOLD:
+                return None
+            if top_N <= 0:
+                return qresult(n_findings=0, scores=[], files=[], base64=[], metadata=[])
+            synced = self._ann is not None and self._ann_version == self._matrix_version
+        if not synced:
+            self._sync_ann(wait=False)
+        with self._matrix_lock:
+            if self._ann is None or self._ann_version != self._matrix_version:
+                return None
+            keys, similarities = self._ann.search(q, top_N)
+        keep = similarities >= threshold
+        keys, similarities = keys[keep], similarities[keep]
+        rows = self._fetch_rows(keys)
+
         result = {
-            "n_findings": len([sim for sim in similarities if sim >= threshold]),
-            "scores": [float(img[2]) for img in top_similar_images],
-            "files": [img[0] for img in top_similar_images],
-            "base64": [img[1] for img in top_similar_images],
-            "metadata": [img[3] for img in top_similar_images]
+            "n_findings": len(keys),
+            "scores": [float(score) for score in similarities],
+            "files": [row[1] for row in rows],
+            "base64": [self._to_base64(row[0]) for row in rows],
+            "metadata": [json.loads(row[2]) for row in rows]
         }
-        
+
+        return qresult(**result)
+
+    def _fetch_rows(self, ids: np.ndarray) -> list:
+        """
+        Fetches the image, file name and metadata of the given rows.
+
+        Parameters
+        ----------
+        ids : np.ndarray
+            The ids of the rows to fetch.
+
+        Returns
+        -------
+        list of tuple
+            The (image_bytes, image_file_name, metadata) of each row, in the order of ids.
+        """
+        ids = [int(row_id) for row_id in ids]
+        found = {}
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay well below SQLite's limit on the number of bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cursor.execute(self._sql_fetch_rows.format(', '.join('?' * len(chunk))), chunk)
+                found.update((row[0], row[1:]) for row in cursor.fetchall())
+        return [found[row_id] for row_id in ids]
+
+    def _find_similar_sqlite_vec(self, q: np.ndarray, top_N: int, threshold: float, where: dict = None):
+        """
+        Runs the KNN search through the sqlite-vec table, without loading vectors into Python.
+
+        The KNN scan is materialized in a CTE before being joined to the collection
+        table, so that SQLite cannot reorder the join around it. Metadata filters are
+        applied on the outer select, leaving the KNN constraint untouched; when they are
+        given, the scan has to rank the whole collection, which sqlite-vec only allows
+        up to SQLITE_VEC_MAX_K rows.
+
+        n_findings is counted over the rows of the KNN scan that pass the threshold
+        and filters, in the same statement. Without filters, the scan only returns
+        the top_N nearest rows, so like the HNSW path it does not count every
+        matching vector of the collection, which would take a second full scan.
+
+        Parameters
+        ----------
+        q : np.ndarray
+            The normalized query vector.
+        top_N : int
+            The number of top similar images to return.
+        threshold : float
+            The similarity threshold for filtering results.
+        where : dict, optional
+            The metadata conditions for filtering results (default is None).
+
+        Returns
+        -------
+        qresult or None
+            A query result object containing the similar images and their details, or
+            None if the query cannot be run by sqlite-vec.
+        """
+        result = {"n_findings": 0, "scores": [], "files": [], "base64": [], "metadata": []}
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # Inserts made through the collection write to the sqlite-vec table too, so
+            # it only needs syncing when another connection committed since the last query
+            cursor.execute("PRAGMA data_version")
+            data_version = cursor.fetchone()[0]
+            if data_version != self._vec_data_versions.get(conn):
+                self._sync_vec_table(cursor)
+                conn.commit()
+                self._vec_data_versions[conn] = data_version
+            if not self._vec_table_exists(cursor):
+                return qresult(**result)
+            k = top_N
+            if where:
+                cursor.execute(self._sql_count)
+                k = cursor.fetchone()[0]
+                if k > self.SQLITE_VEC_MAX_K:
+                    return None
+            where_sql, where_params = self._where_clause(where)
+            query = q.tobytes()
+            matches = []
+            if top_N > 0:
+                cursor.execute(
+                    self._sql_knn.format(where=where_sql),
+                    (query, k, 1.0 - threshold, *where_params, top_N)
+                )
+                matches = cursor.fetchall()
+            result["n_findings"] = matches[0][2] if matches else 0
+        # Images are only read for the rows that made the cut
+        rows = self._fetch_rows([match[0] for match in matches])
+        result["scores"] = [1.0 - match[1] for match in matches]
+        result["files"] = [row[1] for row in rows]
+        result["base64"] = [self._to_base64(row[0]) for row in rows]
+        result["metadata"] = [json.loads(row[2]) for row in rows]
         return qresult(**result)
 
-    def _metadata_matches(self, metadata, where):
+    def _where_clause(self, where: dict, alias: str = 'c'):
         """
-        Checks if the metadata matches the given conditions.
+        Translates metadata conditions into a SQL filter.
+
+        Keys that have an indexed generated column are compared on that column;
+        other keys are extracted from the JSON metadata.
+
+        Parameters
+        ----------
+        where : dict
+            The metadata conditions, matched with equality.
+        alias : str, optional
+            The alias of the collection table in the query (default is 'c').
+
+        Returns
+        -------
+        sql : str
+            The conditions, each prefixed with ' AND ', or an empty string.
+        params : list
+            The values to bind to the conditions.
+        """
+        sql = ''
+        params = []
+        for key, value in (where or {}).items():
+            if key in self._meta_columns:
+                column = f"{alias}.{self._meta_columns[key]}"
+            else:
+                column = f"json_extract({alias}.metadata, ?)"
+                params.append(self._json_path(key))
+            if value is None:
+                sql += f" AND {column} IS NULL"
+            elif isinstance(value, (dict, list)):
+                sql += f" AND {column} = json(?)"
+                params.append(json.dumps(value))
+            else:
+                sql += f" AND {column} = ?"
+                params.append(value)
+        return sql, params
+
+    @staticmethod
+    def _json_path(key) -> str:
+        """Returns the JSON path of a top-level metadata key."""
+        return '$."' + str(key).replace('"', '\\"') + '"'
+
+    def _add_meta_columns(self, cursor, metadata: dict):
+        """
+        Adds an indexed generated column for each new metadata key.
+
+        Only keys made of letters, digits and underscores get a column, and at most
+        MAX_META_COLUMNS of them; other keys are still filtered through json_extract.
 
         Parameters
         ----------
+        cursor : sqlite3.Cursor
+            The cursor used to alter the table.
         metadata : dict
-            The metadata dictionary to check.
+            The metadata of the image about to be inserted.
+        """
+        taken = {column.lower() for column in self._meta_columns.values()}
+        for key in metadata:
+            if key in self._meta_columns or len(self._meta_columns) >= self.MAX_META_COLUMNS:
+                continue
+            if not isinstance(key, str) or not re.fullmatch(r'[A-Za-z0-9_]+', key):
+                continue
+            column = f"meta_{key}"
+            if column.lower() in taken:
+                # SQLite column names are case-insensitive
+                continue
+            try:
+                cursor.execute(f'''
+                ALTER TABLE {self.name} ADD COLUMN {column}
+                GENERATED ALWAYS AS (json_extract(metadata, '{self._json_path(key)}')) VIRTUAL
+                ''')
+            except sqlite3.OperationalError as e:
+                # Another connection may have added it since the table was opened
+                if 'duplicate column' not in str(e):
+                    raise
+            # Prefixed with the length of the table name, as index names are shared by
+            # all tables: the columns a_b.c and a.b_c would otherwise both get idx_a_b_c
+            index = f"idx_{len(self.name)}_{self.name}_{key}"
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {self.name}({column})")
+            self._meta_columns[key] = column
+            taken.add(column.lower())
+
+    def _filter_ids(self, where: dict) -> np.ndarray:
+        """
+        Returns the ids of the rows whose metadata matches the given conditions.
+
+        Parameters
+        ----------
         where : dict
-            The conditions to match against.
+            The metadata conditions, matched with equality.
 
         Returns
         -------
-        bool
-            True if the metadata matches the conditions, False otherwise.
+        np.ndarray
+            The matching row ids.
         """
-        if not where:
-            return True
-        for key, value in where.items():
-            if metadata.get(key) != value:
-                return False
-        return True
+        where_sql, where_params = self._where_clause(where)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql_filter_ids.format(where=where_sql), where_params)
+            return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+
+    @staticmethod
+    def _top_k(similarities: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+        """
+        Selects the k candidates with the highest similarity, best first.
+
+        Uses an O(N) partial selection, so only the k survivors are sorted.
+
+        Parameters
+        ----------
+        similarities : np.ndarray
+            The similarity of every stored vector.
+        candidates : np.ndarray
+            The indices of the vectors eligible for selection.
+        k : int
+            The maximum number of indices to return.
+
+        Returns
+        -------
+        np.ndarray
+            The selected indices, sorted by decreasing similarity.
+        """
+        k = min(k, candidates.size)
+        if k <= 0:
+            return candidates[:0]
+        scores = similarities[candidates]
+        if k < candidates.size:
+            part = np.argpartition(-scores, k - 1)[:k]
+        else:
+            part = np.arange(candidates.size)
+        return candidates[part[np.argsort(-scores[part], kind='stable')]]
 
     def calculate_cosine_similarity(self, vector1: np.ndarray, vector2: np.ndarray) -> float:
         """
@@ -299,7 +1664,16 @@ class Collection:
         float
             The cosine similarity between the two vectors.
         """
-        return np.dot(vector1, vector2) / (np.linalg.norm(vector1) * np.linalg.norm(vector2))
+        vector1 = np.ascontiguousarray(vector1, dtype=np.float32).ravel()
+        vector2 = np.ascontiguousarray(vector2, dtype=np.float32).ravel()
+        # A single square root, and no dispatch on the norm type
+        return float(np.dot(vector1, vector2) / np.sqrt(np.vdot(vector1, vector1) * np.vdot(vector2, vector2)))
+
+    @staticmethod
+    def _to_base64(image_data: bytes) -> str:
+        """Encodes stored image bytes as the base64 string returned in query results."""
+        # b2a_base64 skips base64.b64encode's wrapper, and base64 output is plain ASCII
+        return binascii.b2a_base64(image_data, newline=False).decode('ascii')
 
     def image_file_to_base64(self, image_path: str) -> str:
         """
@@ -316,7 +1690,7 @@ class Collection:
             The base64 encoded string of the image.
         """
         with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+            return self._to_base64(image_file.read())
 
     def base64_to_image(self, base64_string: str) -> Image.Image:
         """
@@ -0,0 +1,139 @@
+"""
+Approximate nearest neighbour indexes used by Collection(index='hnsw').
+
+Both backends build an HNSW graph over L2-normalized vectors keyed by row id,
+and expose the same small interface. usearch is preferred when installed, and
+FAISS is used otherwise; HNSW_BACKEND is None when neither is available.
+"""
+import os
+import numpy as np
+
+try:
+    from usearch.index import Index as UsearchIndex
+except ImportError:
+    UsearchIndex = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+class UsearchHNSW:
+    """
+    A usearch HNSW graph using the cosine metric.
+
+    Attributes
+    ----------
+    SUFFIX : str
+        The extension of the files the graph is saved to.
+    """
+    SUFFIX = 'usearch'
+
+    def __init__(self, index):
+        self._index = index
+
+    @classmethod
+    def create(cls, ndim: int):
+        """Creates an empty graph for vectors of dimension ndim."""
+        return cls(UsearchIndex(ndim=ndim, metric='cos', dtype='f32'))
+
+    @classmethod
+    def restore(cls, path: str):
+        """Loads the graph saved at path, or returns None if there is none."""
+        index = UsearchIndex.restore(path)
+        return cls(index) if index is not None else None
+
+    @property
+    def ndim(self) -> int:
+        return self._index.ndim
+
+    def __len__(self):
+        return len(self._index)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Returns whether each key is in the graph."""
+        return np.asarray(self._index.contains(keys), dtype=bool).reshape(-1)
+
+    def add(self, keys, vectors: np.ndarray):
+        """Adds vectors under the given keys."""
+        self._index.add(keys, vectors)
+
+    def search(self, q: np.ndarray, count: int):
+        """Returns the keys of the count approximate nearest vectors and their cosine similarity."""
+        if count <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        matches = self._index.search(q, count)
+        return matches.keys, 1.0 - matches.distances
+
+    def save(self, path: str):
+        """Writes the graph to path."""
+        self._index.save(path)
+
+
+class FaissHNSW:
+    """
+    A FAISS IndexHNSWFlat graph using the inner product, which is the cosine similarity
+    of normalized vectors, wrapped in an IndexIDMap2 to key vectors by row id.
+
+    Attributes
+    ----------
+    SUFFIX : str
+        The extension of the files the graph is saved to.
+    M : int
+        The number of neighbours of each node of the graph.
+    """
+    SUFFIX = 'faiss'
+    M = 32
+
+    def __init__(self, index):
+        self._index = index
+
+    @classmethod
+    def create(cls, ndim: int):
+        """Creates an empty graph for vectors of dimension ndim."""
+        return cls(faiss.IndexIDMap2(faiss.IndexHNSWFlat(ndim, cls.M, faiss.METRIC_INNER_PRODUCT)))
+
+    @classmethod
+    def restore(cls, path: str):
+        """Loads the graph saved at path, or returns None if there is none."""
+        if not os.path.exists(path):
+            return None
+        return cls(faiss.read_index(path))
+
+    @property
+    def ndim(self) -> int:
+        return self._index.d
+
+    def __len__(self):
+        return self._index.ntotal
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Returns whether each key is in the graph."""
+        return np.isin(keys, faiss.vector_to_array(self._index.id_map))
+
+    def add(self, keys, vectors: np.ndarray):
+        """Adds vectors under the given keys."""
+        keys = np.atleast_1d(np.asarray(keys, dtype=np.int64))
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(keys), -1)
+        self._index.add_with_ids(vectors, keys)
+
+    def search(self, q: np.ndarray, count: int):
+        """Returns the keys of the count approximate nearest vectors and their cosine similarity."""
+        if count <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        similarities, keys = self._index.search(np.ascontiguousarray(q, dtype=np.float32).reshape(1, -1), count)
+        found = keys[0] >= 0
+        return keys[0][found], similarities[0][found]
+
+    def save(self, path: str):
+        """Writes the graph to path."""
+        faiss.write_index(self._index, path)
+
+
+if UsearchIndex is not None:
+    HNSW_BACKEND = UsearchHNSW
+elif faiss is not None:
+    HNSW_BACKEND = FaissHNSW
+else:
+    HNSW_BACKEND = None
@@ -0,0 +1,108 @@
+/*
+ * Fused cosine similarity and top-k selection over a row-major float32 matrix.
+ *
+ * Rows are expected to be L2-normalized, so the cosine similarity is a plain dot
+ * product. The library is loaded with ctypes by PymvDB/_kernels.py; it does not
+ * use the Python C API.
+ *
+ * On x86-64, GCC and Clang compile the hot loop once per instruction set listed in
+ * KERNEL_TARGETS and pick the best one for the running CPU when the library is
+ * loaded. Other architectures (e.g. aarch64, where NEON is always available) get a
+ * single auto-vectorized build.
+ */
+#include <stdint.h>
+
+#if defined(__x86_64__) && (defined(__GNUC__) || defined(__clang__)) && defined(__linux__)
+#define KERNEL_TARGETS __attribute__((target_clones("avx512f", "avx2", "default")))
+#else
+#define KERNEL_TARGETS
+#endif
+
+#if defined(_WIN32)
+#define KERNEL_EXPORT __declspec(dllexport)
+#else
+#define KERNEL_EXPORT
+#endif
+
+/* Independent partial sums let the compiler vectorize the reduction without -ffast-math */
+#define LANES 16
+
+KERNEL_TARGETS
+static float dot(const float *a, const float *b, int64_t d)
+{
+    float acc[LANES] = {0};
+    int64_t j = 0;
+    for (; j + LANES <= d; j += LANES) {
+        for (int l = 0; l < LANES; l++) {
+            acc[l] += a[j + l] * b[j + l];
+        }
+    }
+    float s = 0.0f;
+    for (int l = 0; l < LANES; l++) {
+        s += acc[l];
+    }
+    for (; j < d; j++) {
+        s += a[j] * b[j];
+    }
+    return s;
+}
+
+/* Restores the min-heap property after the root of the heap was replaced */
+static void sift_down(float *scores, int64_t *rows, int64_t k)
+{
+    int64_t i = 0;
+    for (;;) {
+        int64_t smallest = i;
+        int64_t left = 2 * i + 1;
+        int64_t right = left + 1;
+        if (left < k && scores[left] < scores[smallest]) {
+            smallest = left;
+        }
+        if (right < k && scores[right] < scores[smallest]) {
+            smallest = right;
+        }
+        if (smallest == i) {
+            return;
+        }
+        float score = scores[i];
+        int64_t row = rows[i];
+        scores[i] = scores[smallest];
+        rows[i] = rows[smallest];
+        scores[smallest] = score;
+        rows[smallest] = row;
+        i = smallest;
+    }
+}
+
+/*
+ * Scores the n rows of m (n x d) against q and keeps the k best rows at or above
+ * threshold whose allowed flag is set (allowed may be NULL to allow every row).
+ *
+ * out_rows and out_scores must hold k entries. They receive the selected rows as a
+ * min-heap, in no particular order; unused entries have a row of -1.
+ *
+ * Returns the number of rows at or above threshold, allowed or not.
+ */
+KERNEL_EXPORT int64_t topk_cosine(const float *m, const float *q, int64_t n, int64_t d,
+                                  float threshold, int64_t k, const uint8_t *allowed,
+                                  int64_t *out_rows, float *out_scores)
+{
+    int64_t count = 0;
+    for (int64_t i = 0; i < k; i++) {
+        out_rows[i] = -1;
+        out_scores[i] = -3.0f;  /* below any cosine similarity */
+    }
+    for (int64_t i = 0; i < n; i++) {
+        float s = dot(m + i * d, q, d);
+        if (s < threshold) {
+            continue;
+        }
+        count++;
+        if ((allowed == 0 || allowed[i]) && s > out_scores[0]) {
+            out_scores[0] = s;
+            out_rows[0] = i;
+            sift_down(out_scores, out_rows, k);
+        }
+    }
+    return count;
+}
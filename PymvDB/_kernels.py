@@ -0,0 +1,178 @@
+"""
+Optional compiled kernels for the brute-force similarity search.
+
+Each kernel fuses the dot products, the threshold test and the top-k selection
+into a single pass over the vector matrix, without materializing the array of
+similarities. A parallel Numba kernel is used when numba is installed and several
+threads are available, then the C kernel built from _cosine_kernel.c when the
+package was installed with a C compiler; otherwise topk_cosine returns None and
+Collection falls back to NumPy.
+
+Numba picks TBB as its threading layer when it is installed, and TBB's thread pool
+hangs interpreter shutdown once kernels were launched from threads other than the
+main one, as in the HTTP server. The Numba kernel is therefore only used from the
+main thread, unless the NUMBA_THREADING_LAYER environment variable selects the
+'omp' or 'workqueue' layer.
+"""
+import ctypes
+import importlib.util
+import threading
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+def _load_c_kernel():
+    """Loads the compiled _cosine_kernel library with ctypes, or returns None if it was not built."""
+    try:
+        spec = importlib.util.find_spec(f"{__package__}._cosine_kernel")
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None:
+        return None
+    try:
+        library = ctypes.CDLL(spec.origin)
+    except OSError:
+        return None
+    kernel = library.topk_cosine
+    kernel.restype = ctypes.c_int64
+    kernel.argtypes = [
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int64, ctypes.c_int64,
+        ctypes.c_float, ctypes.c_int64, ctypes.c_void_p,
+        ctypes.c_void_p, ctypes.c_void_p,
+    ]
+    return kernel
+
+
+_c_kernel = _load_c_kernel()
+
+# Numba's workqueue threading layer, used when neither TBB nor OpenMP is
+# available, does not support parallel kernels launched from several threads.
+_numba_lock = threading.Lock()
+
+# The threading layers that can be used from any thread, see the module docstring
+THREAD_SAFE_LAYERS = ('omp', 'workqueue')
+
+# Rows per parallel task: large enough to amortize the per-task heap, small
+# enough to balance the work across threads.
+CHUNK_ROWS = 16384
+
+# Below any cosine similarity. A finite value is used, as fastmath lets LLVM
+# assume that no value is infinite.
+EMPTY_SCORE = -3.0
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _sift_down(heap_scores, heap_rows):
+        """Restores the min-heap property after the root of the heap was replaced."""
+        k = heap_scores.shape[0]
+        i = 0
+        while True:
+            smallest = i
+            left = 2 * i + 1
+            right = left + 1
+            if left < k and heap_scores[left] < heap_scores[smallest]:
+                smallest = left
+            if right < k and heap_scores[right] < heap_scores[smallest]:
+                smallest = right
+            if smallest == i:
+                return
+            heap_scores[i], heap_scores[smallest] = heap_scores[smallest], heap_scores[i]
+            heap_rows[i], heap_rows[smallest] = heap_rows[smallest], heap_rows[i]
+            i = smallest
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _topk_cos(M, q, threshold, k, allowed, chunk_rows):
+        """
+        Scores every row of M against q, keeping a size k min-heap per chunk of rows.
+
+        Returns the heaps of every chunk, to be merged by the caller, and the number
+        of rows of each chunk at or above the threshold.
+        """
+        N, D = M.shape
+        n_chunks = (N + chunk_rows - 1) // chunk_rows
+        # A chunk cannot contribute more than its own rows
+        heap_size = min(k, chunk_rows)
+        out_scores = np.full((n_chunks, heap_size), EMPTY_SCORE, dtype=np.float32)
+        out_rows = np.full((n_chunks, heap_size), -1, dtype=np.int64)
+        counts = np.zeros(n_chunks, dtype=np.int64)
+        filtered = allowed.shape[0] > 0
+        for c in numba.prange(n_chunks):
+            heap_scores = out_scores[c]
+            heap_rows = out_rows[c]
+            count = 0
+            for i in range(c * chunk_rows, min(N, (c + 1) * chunk_rows)):
+                s = np.float32(0.0)
+                for j in range(D):
+                    s += M[i, j] * q[j]
+                if s >= threshold:
+                    count += 1
+                    if (not filtered or allowed[i]) and s > heap_scores[0]:
+                        heap_scores[0] = s
+                        heap_rows[0] = i
+                        _sift_down(heap_scores, heap_rows)
+            counts[c] = count
+        return out_scores, out_rows, counts
+
+
+def topk_cosine(M: np.ndarray, q: np.ndarray, threshold: float, k: int, allowed: np.ndarray = None):
+    """
+    Finds the rows of M with the highest inner product with q.
+
+    Parameters
+    ----------
+    M : np.ndarray
+        The L2-normalized float32 vectors, of shape (N, D).
+    q : np.ndarray
+        The normalized float32 query vector.
+    threshold : float
+        The similarity threshold for filtering results.
+    k : int
+        The number of rows to return.
+    allowed : np.ndarray, optional
+        A boolean mask of the rows that may be returned (default is None, all rows).
+
+    Returns
+    -------
+    tuple or None
+        The positions of the best rows in descending order of similarity, their
+        similarities, and the number of rows at or above the threshold, or None if
+        no compiled kernel is available.
+    """
+    if len(M) == 0 or k <= 0:
+        return None
+    # The Numba kernel only pays off when it can spread the scan over several threads
+    # The configured count is read rather than get_num_threads(), which would start
+    # Numba's thread pool even when the C kernel ends up being used.
+    use_numba = numba is not None and numba.config.NUMBA_NUM_THREADS > 1 and (
+        threading.current_thread() is threading.main_thread()
+        or numba.config.THREADING_LAYER in THREAD_SAFE_LAYERS
+    )
+    if not use_numba and _c_kernel is None:
+        return None
+    k = min(k, len(M))
+    M = np.ascontiguousarray(M, dtype=np.float32)
+    q = np.ascontiguousarray(q, dtype=np.float32)
+    if use_numba:
+        if allowed is None:
+            allowed = np.empty(0, dtype=np.bool_)
+        with _numba_lock:
+            scores, rows, counts = _topk_cos(M, q, np.float32(threshold), k, allowed, CHUNK_ROWS)
+        scores, rows = scores.ravel(), rows.ravel()
+    else:
+        scores = np.empty(k, dtype=np.float32)
+        rows = np.empty(k, dtype=np.int64)
+        if allowed is not None:
+            allowed = np.ascontiguousarray(allowed, dtype=np.bool_)
+        counts = np.int64(_c_kernel(
+            M.ctypes.data, q.ctypes.data, M.shape[0], M.shape[1], threshold, k,
+            None if allowed is None else allowed.ctypes.data,
+            rows.ctypes.data, scores.ctypes.data,
+        ))
+    found = rows >= 0
+    scores, rows = scores[found], rows[found]
+    order = np.argsort(-scores, kind='stable')[:k]
+    return rows[order], scores[order], int(counts.sum())
@@ -1,6 +1,6 @@
 # embedding.py
 import numpy as np
-from numpy.linalg import norm
+import torch
 from transformers import AutoImageProcessor, AutoModel
 from PIL import Image
 
@@ -14,15 +14,19 @@ class HuggingFaceEmbedding:
         Processor for image preprocessing.
     model : AutoModel
         Model to generate image embeddings.
+    device : str
+        The device the model runs on.
 
     Methods
     -------
     __call__(image)
-        Generates an embedding for the given image.
+        Generates an embedding for the given image, or for each image of a list.
+    batch(images)
+        Generates embeddings for several images in a single forward pass.
     similarity(vector1, vector2)
         Calculates the cosine similarity between two vectors.
     """
-    def __init__(self, model_name='google/vit-base-patch16-224-in21k'):
+    def __init__(self, model_name='google/vit-base-patch16-224-in21k', device=None, compile=False):
         """
         Initializes the HuggingFaceEmbedding with the specified model.
 
@@ -30,28 +34,66 @@ class HuggingFaceEmbedding:
         ----------
         model_name : str, optional
             The name of the Hugging Face model to use (default is 'google/vit-base-patch16-224-in21k').
+        device : str, optional
+            The device to run the model on. If None, CUDA is used when available, and
+            the CPU otherwise (default is None). On CUDA, the forward pass runs in fp16.
+        compile : bool, optional
+            Whether to compile the model with torch.compile, which fuses its operators
+            at the cost of a slow first call (default is False). Ignored on PyTorch
+            versions without torch.compile.
         """
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.device = device
         self.processor = AutoImageProcessor.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(self.device).eval()
+        if compile and hasattr(torch, 'compile'):
+            # dynamic=True avoids recompiling the model for every new batch size
+            self.model = torch.compile(self.model, mode='reduce-overhead', dynamic=True)
     
-    def __call__(self, image: Image.Image) -> np.ndarray:
+    def __call__(self, image) -> np.ndarray:
         """
-        Generates an embedding for the given image.
+        Generates an embedding for the given image, or for each image of a list.
 
         Parameters
         ----------
-        image : PIL.Image.Image
-            The image to generate an embedding for.
+        image : PIL.Image.Image or list of PIL.Image.Image
+            The image, or images, to generate an embedding for.
 
         Returns
         -------
         numpy.ndarray
-            The embedding vector.
+            The embedding vector, of shape (1, D), or the embedding vectors of the
+            images, of shape (len(image), D).
         """
-        inputs = self.processor(images=image, return_tensors="pt")
-        outputs = self.model(**inputs)
+        if isinstance(image, (list, tuple)):
+            return self.batch(list(image))
+        return self.batch([image])
+
+    def batch(self, images: list) -> np.ndarray:
+        """
+        Generates embeddings for several images in a single forward pass.
+
+        Parameters
+        ----------
+        images : list of PIL.Image.Image
+            The images to generate embeddings for.
+
+        Returns
+        -------
+        numpy.ndarray
+            The embedding vectors, of shape (len(images), D).
+        """
+        inputs = self.processor(images=images, return_tensors="pt")
+        inputs = {name: tensor.to(self.device, non_blocking=True) for name, tensor in inputs.items()}
+        device_type = torch.device(self.device).type
+        # No autograd bookkeeping is needed for inference
+        with torch.inference_mode(), torch.autocast(device_type, dtype=torch.float16, enabled=device_type == 'cuda'):
+            outputs = self.model(**inputs)
         last_hidden_states = outputs.last_hidden_state
-        features = last_hidden_states[:, 0].detach().numpy()
+        # contiguous() copies out the CLS rows, so that the array does not keep the
+        # whole hidden state alive, and is stored without another copy
+        features = last_hidden_states[:, 0].float().contiguous().cpu().numpy()
         return features
 
     @staticmethod
@@ -71,4 +113,7 @@ class HuggingFaceEmbedding:
         float
             The cosine similarity between the vectors.
         """
-        return np.dot(vector1, vector2) / (norm(vector1) * norm(vector2))
+        vector1 = np.ascontiguousarray(vector1, dtype=np.float32).ravel()
+        vector2 = np.ascontiguousarray(vector2, dtype=np.float32).ravel()
+        # A single square root, and no dispatch on the norm type
+        return float(np.dot(vector1, vector2) / np.sqrt(np.vdot(vector1, vector1) * np.vdot(vector2, vector2)))
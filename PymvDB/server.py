@@ -1,63 +1,96 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, request, jsonify
 from .Client import Client
-from .query_result import qresult
-from .Collection import Collection
 from .embeddings import HuggingFaceEmbedding
 from PIL import Image
 import io
+import json
 import base64
-import numpy as np
+import atexit
+import threading
 
 HTTPserver = Flask(__name__)
 
 embedding_model = HuggingFaceEmbedding()
 
-def get_db():
-    if 'db' not in g:
-        g.db = Client(embedding_model, persistent_path='db.db3').conn
-    return g.db
+client = Client(embedding_model, persistent_path='db.db3')
 
-@HTTPserver.teardown_appcontext
-def close_db(exception):
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+# Collections are opened once and shared by every request, so that their pooled
+# SQLite connections and vector matrix are reused across requests.
+collections = {}
+collections_lock = threading.Lock()
 
-def image_from_base64(base64_string):
-    image_data = base64.b64decode(base64_string)
-    return Image.open(io.BytesIO(image_data))
+def get_collection(name):
+    with collections_lock:
+        collection = collections.get(name)
+        if collection is None:
+            collection = client.create_collection(name)
+            collections[name] = collection
+        return collection
+
+@atexit.register
+def close_collections():
+    with collections_lock:
+        for collection in collections.values():
+            collection.close()
+
+# Multipart form fields that hold JSON encoded values
+JSON_FORM_FIELDS = ('metadata', 'top_N', 'threshold', 'where')
+
+def read_image_request():
+    """
+    Reads the fields and raw image bytes of a request.
+
+    Images are either sent as a multipart 'image' file, with the other fields in
+    the form, or base64 encoded in the 'image_base64' field of a JSON body.
+    """
+    if 'image' in request.files:
+        data = request.form.to_dict()
+        for key in JSON_FORM_FIELDS:
+            if key in data:
+                data[key] = json.loads(data[key])
+        return data, request.files['image'].read()
+    data = request.json
+    return data, base64.b64decode(data['image_base64'])
 
 @HTTPserver.route('/create_collection', methods=['POST'])
 def create_collection():
     data = request.json
     collection_name = data['name']
+    try:
+        get_collection(collection_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"message": f"Collection '{collection_name}' created."})
 
 @HTTPserver.route('/add_image', methods=['POST'])
 def add_image():
-    data = request.json
+    data, image_bytes = read_image_request()
     collection_name = data['collection']
     file_name = data['file']
-    image_base64 = data['image_base64']
     metadata = data.get('metadata', {})
 
-    image = image_from_base64(image_base64)
-    collection = Collection(collection_name, get_db(), embedding_model)
-    collection.add_image_vector(file_name, image_base64, embedding_model(image), metadata)
+    image = Image.open(io.BytesIO(image_bytes))
+    try:
+        collection = get_collection(collection_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    collection.add_image_vector(file_name, image_bytes, embedding_model(image), metadata)
     
     return jsonify({"message": "Image added to collection."})
 
 @HTTPserver.route('/find_similar', methods=['POST'])
 def find_similar():
-    data = request.json
+    data, image_bytes = read_image_request()
     collection_name = data['collection']
-    image_base64 = data['image_base64']
     top_N = data.get('top_N', 5)
     threshold = data.get('threshold', 0.0)
     where = data.get('where', None)
 
-    image = image_from_base64(image_base64)
-    collection = Collection(collection_name, get_db(), embedding_model)
+    image = Image.open(io.BytesIO(image_bytes))
+    try:
+        collection = get_collection(collection_name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     result = collection.find_similar_images(image, top_N, threshold, where)
 
     return jsonify({
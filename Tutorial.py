@@ -14,13 +14,11 @@ def init_local():
     # Directory containing the images
     image_directory = "example_images"
 
-    # Loop through all files in the directory
-    for filename in os.listdir(image_directory):
-        # Construct the full file path
-        file_path = os.path.join(image_directory, filename)
-        
-        # Insert the image into the database
-        collection.add_image(file_path, metadata={"extension": file_path[-4:]})
+    # Construct the full path of every file in the directory
+    file_paths = [os.path.join(image_directory, filename) for filename in os.listdir(image_directory)]
+
+    # Insert all the images into the database at once, embedding them in batches
+    collection.add_images(file_paths, metadatas=[{"extension": file_path[-4:]} for file_path in file_paths])
 
     return Db, collection
 
@@ -1,16 +1,34 @@
 # setup.py
-from setuptools import setup, find_packages
+import sys
+from setuptools import setup, find_packages, Extension
+
+# Plain C library loaded with ctypes by PymvDB/_kernels.py. It is optional: when it
+# cannot be built, searches fall back to NumPy.
+cosine_kernel = Extension(
+    "PymvDB._cosine_kernel",
+    sources=["PymvDB/_cosine_kernel.c"],
+    extra_compile_args=[] if sys.platform == "win32" else ["-O3"],
+    optional=True,
+)
 
 setup(
     name="image_embedding_lib",
     version="0.1.2",
     packages=find_packages(),
+    ext_modules=[cosine_kernel],
     install_requires=[
         "numpy",
         "Pillow",
         "transformers",
         "torch",
     ],
+    extras_require={
+        "sqlite-vec": ["sqlite-vec"],
+        "blosc2": ["blosc2"],
+        "faiss": ["faiss-cpu"],
+        "hnsw": ["usearch"],
+        "numba": ["numba"],
+    },
     author="Boris Burgarella",
     author_email="b.burgarella@gmail.com",
     description="A simple vector database for images",
@@ -0,0 +1,36 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image
+
+DIM = 768
+
+
+class PixelEmbedding:
+    """Stands in for a Hugging Face model: embeds an image as its 16x16 RGB pixels (768 values)."""
+
+    def __call__(self, image):
+        if isinstance(image, (list, tuple)):
+            return np.concatenate([self(i) for i in image])
+        pixels = np.asarray(image.convert('RGB').resize((16, 16)), dtype=np.float32)
+        return pixels.reshape(1, DIM) - 127.5
+
+
+def random_image(rng) -> Image.Image:
+    return Image.fromarray(rng.integers(0, 256, (16, 16, 3), dtype=np.uint8))
+
+
+def jpeg_bytes(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def embedding_model():
+    return PixelEmbedding()
@@ -0,0 +1,73 @@
+import numpy as np
+from PIL import Image
+
+from PymvDB.Collection import Collection, LRUCache, image_cache_key
+from conftest import random_image
+
+
+def palette_image(color):
+    image = Image.new('P', (16, 16), 0)
+    image.putpalette(list(color) + [0, 0, 0] * 255)
+    return image
+
+
+class CountingEmbedding:
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def __call__(self, image):
+        self.calls += 1
+        return self.model(image)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    cache.clear()
+    assert cache.get('a') is None
+
+
+def test_cache_key_depends_on_pixels(rng):
+    image = random_image(rng)
+    assert image_cache_key(image) == image_cache_key(image.copy())
+    assert image_cache_key(image) != image_cache_key(random_image(rng))
+    assert image_cache_key(image) != image_cache_key(image.convert('L'))
+
+
+def test_cache_key_depends_on_palette():
+    red, blue = palette_image((255, 0, 0)), palette_image((0, 0, 255))
+    assert red.tobytes() == blue.tobytes()
+    assert image_cache_key(red) != image_cache_key(blue)
+    transparent = palette_image((255, 0, 0))
+    transparent.info['transparency'] = 0
+    assert image_cache_key(red) != image_cache_key(transparent)
+
+
+def test_repeated_queries_skip_the_model(embedding_model, rng, tmp_path):
+    model = CountingEmbedding(embedding_model)
+    collection = Collection('test', str(tmp_path / 'test.db3'), model)
+    collection.add_image_vector('a.jpg', b'jpeg', rng.standard_normal(768), {})
+    image = random_image(rng)
+    first = collection.find_similar_images(image)
+    second = collection.find_similar_images(image.copy(), top_N=1)
+    assert model.calls == 1
+    assert second.files == first.files[:1]
+    collection.close()
+
+
+def test_palette_queries_are_not_mixed_up(embedding_model, tmp_path):
+    collection = Collection('test', str(tmp_path / 'test.db3'), embedding_model, quantization='float32')
+    red, blue = palette_image((255, 0, 0)), palette_image((0, 0, 255))
+    collection.add_image_vector('red.png', b'png', embedding_model(red), {})
+    collection.add_image_vector('blue.png', b'png', embedding_model(blue), {})
+    assert collection.find_similar_images(red, top_N=1).files == ['red.png']
+    result = collection.find_similar_images(blue, top_N=1)
+    assert result.files == ['blue.png']
+    np.testing.assert_allclose(result.scores, [1.0], atol=1e-5)
+    collection.close()
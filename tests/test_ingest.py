@@ -0,0 +1,86 @@
+import pytest
+
+from PymvDB.Collection import Collection
+from conftest import PixelEmbedding, random_image
+
+
+class BatchEmbedding:
+    """Records the size of each batch, and fails if images are embedded one by one."""
+
+    def __init__(self):
+        self.model = PixelEmbedding()
+        self.batches = []
+
+    def __call__(self, image):
+        raise AssertionError("images should be embedded in batches")
+
+    def batch(self, images):
+        self.batches.append(len(images))
+        return self.model(images)
+
+
+class SingleEmbedding(PixelEmbedding):
+    """Counts the images embedded, without a batch method."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, image):
+        self.calls += 1
+        return super().__call__(image)
+
+
+@pytest.fixture
+def image_files(rng, tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f'image_{i}.png'
+        random_image(rng).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def check_stored(collection, image_files):
+    files, paths, vectors, metadata = collection.get_all_vectors()
+    assert paths == image_files
+    assert metadata == [{'i': i} for i in range(len(image_files))]
+    for path in image_files:
+        image_data, image = collection._read_image(path)
+        result = collection.find_similar_images(image, top_N=1)
+        assert result.files == [path]
+        assert result.base64 == [collection._to_base64(image_data)]
+
+
+def test_add_images_embeds_in_batches(image_files, tmp_path):
+    model = BatchEmbedding()
+    collection = Collection('test', str(tmp_path / 'test.db3'), model, quantization='float32')
+    collection.add_images(image_files, [{'i': i} for i in range(len(image_files))], batch_size=4)
+    assert model.batches == [4, 4, 2]
+    collection.embedding_model = PixelEmbedding()
+    check_stored(collection, image_files)
+    collection.close()
+
+
+def test_add_images_without_batch_method(image_files, tmp_path):
+    model = SingleEmbedding()
+    collection = Collection('test', str(tmp_path / 'test.db3'), model, quantization='float32')
+    collection.add_images(image_files, [{'i': i} for i in range(len(image_files))], batch_size=4)
+    assert model.calls == len(image_files)
+    check_stored(collection, image_files)
+    collection.close()
+
+
+def test_add_images_ignores_known_files(image_files, tmp_path):
+    collection = Collection('test', str(tmp_path / 'test.db3'), PixelEmbedding(), quantization='float32')
+    collection.add_images(image_files[:4], [{'i': i} for i in range(4)])
+    collection.add_images(image_files + image_files[:1], [{'i': i} for i in range(len(image_files))] + [{}])
+    check_stored(collection, image_files)
+    collection.close()
+
+
+def test_add_images_checks_metadata_length(image_files, tmp_path):
+    collection = Collection('test', str(tmp_path / 'test.db3'), PixelEmbedding())
+    with pytest.raises(ValueError):
+        collection.add_images(image_files, [{}])
+    assert collection.get_all_vectors()[1] == []
+    collection.close()
@@ -0,0 +1,89 @@
+import threading
+import numpy as np
+import pytest
+
+from PymvDB import _kernels
+
+
+def reference_topk(M, q, threshold, k, allowed=None):
+    similarities = M @ q
+    above = similarities >= threshold
+    mask = above if allowed is None else above & allowed
+    candidates = np.nonzero(mask)[0]
+    top = candidates[np.argsort(-similarities[candidates], kind='stable')][:k]
+    return top, similarities[top], int(np.count_nonzero(above))
+
+
+@pytest.fixture(params=['c', 'numba'])
+def kernel(request, monkeypatch):
+    """Forces topk_cosine onto one kernel, with small chunks so that the Numba heaps get merged."""
+    if request.param == 'c':
+        if _kernels._c_kernel is None:
+            pytest.skip("the C kernel was not built")
+        monkeypatch.setattr(_kernels, 'numba', None)
+    else:
+        numba = pytest.importorskip('numba')
+        monkeypatch.setattr(numba.config, 'NUMBA_NUM_THREADS', 2)
+        monkeypatch.setattr(_kernels, 'CHUNK_ROWS', 64)
+    return request.param
+
+
+@pytest.fixture
+def matrix(rng):
+    M = rng.standard_normal((1000, 96)).astype(np.float32)
+    return M / np.linalg.norm(M, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize('threshold, k', [(-1.0, 10), (0.1, 5), (0.2, 1000), (0.9, 3)])
+def test_topk_cosine_matches_numpy(kernel, matrix, threshold, k):
+    q = matrix[3]
+    rows, scores, count = _kernels.topk_cosine(matrix, q, threshold, k)
+    expected_rows, expected_scores, expected_count = reference_topk(matrix, q, threshold, k)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+    assert count == expected_count
+
+
+def test_topk_cosine_allowed_mask(kernel, matrix, rng):
+    q = matrix[7]
+    allowed = rng.random(len(matrix)) < 0.3
+    rows, scores, count = _kernels.topk_cosine(matrix, q, 0.0, 20, allowed)
+    expected_rows, expected_scores, expected_count = reference_topk(matrix, q, 0.0, 20, allowed)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+    assert count == expected_count
+
+
+def test_topk_cosine_huge_k(kernel, matrix):
+    q = matrix[5]
+    rows, scores, count = _kernels.topk_cosine(matrix[:100], q, 0.0, 10 ** 10)
+    expected_rows, expected_scores, expected_count = reference_topk(matrix[:100], q, 0.0, 10 ** 10)
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+    assert count == expected_count
+
+
+def test_topk_cosine_empty_input(kernel, matrix):
+    assert _kernels.topk_cosine(matrix, matrix[0], 0.0, 0) is None
+    assert _kernels.topk_cosine(matrix[:0], matrix[0], 0.0, 5) is None
+
+
+@pytest.mark.parametrize('layer, expected', [('default', False), ('tbb', False), ('omp', True), ('workqueue', True)])
+def test_numba_kernel_runs_off_the_main_thread_only_on_safe_layers(matrix, monkeypatch, layer, expected):
+    numba = pytest.importorskip('numba')
+    monkeypatch.setattr(numba.config, 'NUMBA_NUM_THREADS', 2)
+    monkeypatch.setattr(numba.config, 'THREADING_LAYER', layer)
+    calls = []
+
+    def fake_kernel(M, q, threshold, k, allowed, chunk_rows):
+        # Launching the real kernel off the main thread is what can hang shutdown
+        calls.append(k)
+        return np.zeros((1, k), dtype=np.float32), np.full((1, k), -1), np.zeros(1, dtype=np.int64)
+
+    monkeypatch.setattr(_kernels, '_topk_cos', fake_kernel)
+    thread = threading.Thread(target=_kernels.topk_cosine, args=(matrix, matrix[0], 0.0, 5))
+    thread.start()
+    thread.join()
+    assert bool(calls) == expected
+    _kernels.topk_cosine(matrix, matrix[0], 0.0, 5)
+    assert calls
@@ -0,0 +1,69 @@
+import base64
+import shutil
+import sqlite3
+from pathlib import Path
+import numpy as np
+import pytest
+
+from PymvDB.Collection import Collection
+
+BASELINE_DB = Path(__file__).resolve().parent.parent / 'db.db3'
+NAME = 'Example_Collection'
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A copy of the database shipped with the repository, which stores base64 images and raw vectors."""
+    path = tmp_path / 'legacy.db3'
+    shutil.copy(BASELINE_DB, path)
+    return str(path)
+
+
+def read_rows(path, columns):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT {columns} FROM {NAME} ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('sqlite_version', [sqlite3.sqlite_version_info, (3, 31, 1)])
+def test_baseline_database_migrates(legacy_db, embedding_model, monkeypatch, sqlite_version):
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', sqlite_version)
+    before = read_rows(legacy_db, "id, image_base64, image_file_name, vector, metadata")
+    collection = Collection(NAME, legacy_db, embedding_model)
+
+    conn = sqlite3.connect(legacy_db)
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({NAME})")}
+    conn.close()
+    assert 'image_base64' not in columns
+    assert {'image_bytes', 'normalized', 'quant_kind', 'vector_codec'} <= columns
+
+    after = read_rows(legacy_db, "id, image_bytes, image_file_name, vector, metadata, normalized, quant_kind")
+    assert len(after) == len(before) > 0
+    for old, new in zip(before, after):
+        assert new[0] == old[0] and new[2] == old[2] and new[4] == old[4]
+        assert new[1] == base64.b64decode(old[1])
+        assert new[5] == 1 and new[6] == 'float32'
+        vector = np.frombuffer(old[3], dtype=np.float32)
+        np.testing.assert_allclose(np.frombuffer(new[3], dtype=np.float32), vector / np.linalg.norm(vector), atol=1e-6)
+
+    files, paths, vectors, metadata = collection.get_all_vectors()
+    assert paths == [row[2] for row in before]
+    assert files[0] == before[0][1]
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    collection.close()
+
+
+def test_migrated_database_accepts_new_images(legacy_db, embedding_model):
+    collection = Collection(NAME, legacy_db, embedding_model)
+    image_path = Path(__file__).resolve().parent.parent / 'Test_car.jpg'
+    collection.add_image(str(image_path), {'kind': 'car'})
+    result = collection.find_similar_images(collection._read_image(str(image_path))[1], top_N=1, where={'kind': 'car'})
+    assert result.files == [str(image_path)]
+    np.testing.assert_allclose(result.scores, [1.0], atol=1e-2)
+    collection.close()
+
+    reopened = Collection(NAME, legacy_db, embedding_model)
+    assert len(reopened.get_all_vectors()[1]) == len(read_rows(legacy_db, "id"))
+    reopened.close()
@@ -0,0 +1,241 @@
+import importlib
+import itertools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+from PymvDB import _ann
+from PymvDB.Client import Client
+from PymvDB.Collection import Collection, load_vector_extension
+from conftest import DIM, random_image
+
+collection_module = importlib.import_module('PymvDB.Collection')
+
+N_ROWS = 200
+# How far decoded vectors may be from the originals, per quantization
+TOLERANCES = {'int8': 1e-2, 'float16': 1e-3, 'float32': 1e-6}
+
+
+def available_indexes():
+    indexes = ['flat']
+    if collection_module.faiss is not None:
+        indexes.append('faiss')
+    if _ann.UsearchIndex is not None:
+        indexes.append('hnsw-usearch')
+    if _ann.faiss is not None:
+        indexes.append('hnsw-faiss')
+    if load_vector_extension(sqlite3.connect(':memory:')):
+        indexes.append('sqlite-vec')
+    return indexes
+
+
+@pytest.fixture(params=available_indexes())
+def index(request, monkeypatch):
+    """The index to test; HNSW graphs are used past 50 rows, with each available backend."""
+    if request.param.startswith('hnsw'):
+        backend = _ann.UsearchHNSW if request.param == 'hnsw-usearch' else _ann.FaissHNSW
+        monkeypatch.setattr(collection_module, 'HNSW_BACKEND', backend)
+        monkeypatch.setattr(Collection, 'ANN_THRESHOLD', 50)
+        return 'hnsw'
+    return request.param
+
+
+def available_storages():
+    compressions = [c for c in Collection.COMPRESSIONS if c != 'blosc2' or collection_module.blosc2 is not None]
+    return list(itertools.product(Collection.QUANTIZATIONS, compressions))
+
+
+@pytest.fixture(params=available_storages(), ids=lambda storage: f'{storage[0]}-{storage[1] or "raw"}')
+def storage(request):
+    """The quantization and compression of the stored vectors."""
+    return request.param
+
+
+@pytest.fixture
+def collection(index, storage, embedding_model, tmp_path):
+    quantization, compression = storage
+    collection = Collection(
+        'test', str(tmp_path / 'test.db3'), embedding_model,
+        quantization=quantization, index=index, compression=compression
+    )
+    yield collection
+    collection.close()
+
+
+def fill(collection, rng, n=N_ROWS, start=0):
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    for i, vector in enumerate(vectors, start):
+        collection.add_image_vector(f'image_{i}.jpg', b'jpeg', vector, {'parity': i % 2})
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def stored_vectors(collection, vectors):
+    """The vectors as decoded from the table, checked against the normalized originals."""
+    stored = collection.get_all_vectors()[2]
+    np.testing.assert_allclose(stored, vectors, atol=TOLERANCES[collection.quantization])
+    return stored
+
+
+def reference(vectors, q, threshold, top_N, allowed=None):
+    similarities = vectors @ (q / np.linalg.norm(q))
+    above = similarities >= threshold
+    mask = above if allowed is None else above & allowed
+    candidates = np.nonzero(mask)[0]
+    top = candidates[np.argsort(-similarities[candidates])][:top_N]
+    return [f'image_{i}.jpg' for i in top], similarities[top], int(np.count_nonzero(above))
+
+
+@pytest.mark.parametrize('top_N, threshold', [(5, 0.0), (20, -1.0), (3, 0.05)])
+def test_results_match_numpy(collection, embedding_model, rng, top_N, threshold):
+    vectors = stored_vectors(collection, fill(collection, rng))
+    image = random_image(rng)
+    result = collection.find_similar_images(image, top_N=top_N, threshold=threshold)
+    files, scores, n_findings = reference(vectors, embedding_model(image).ravel(), threshold, top_N)
+    assert result.files == files
+    np.testing.assert_allclose(result.scores, scores, atol=1e-4)
+    assert result.metadata == [{'parity': int(f[len('image_'):-len('.jpg')]) % 2} for f in files]
+    if collection.index in ('hnsw', 'sqlite-vec'):
+        # These only count the nearest neighbours they scored
+        assert result.n == len(files)
+    else:
+        assert result.n == n_findings
+
+
+def test_filtered_results_match_numpy(collection, embedding_model, rng):
+    vectors = stored_vectors(collection, fill(collection, rng, n=100))
+    image = random_image(rng)
+    result = collection.find_similar_images(image, top_N=5, threshold=-1.0, where={'parity': 1})
+    allowed = np.arange(len(vectors)) % 2 == 1
+    files, scores, _ = reference(vectors, embedding_model(image).ravel(), -1.0, 5, allowed)
+    assert result.files == files
+    np.testing.assert_allclose(result.scores, scores, atol=1e-4)
+
+
+def test_metadata_columns_of_similar_names_are_all_indexed(embedding_model, rng, tmp_path):
+    path = str(tmp_path / 'test.db3')
+    first = Collection('a_b', path, embedding_model, quantization='float32')
+    second = Collection('a', path, embedding_model, quantization='float32')
+    first.add_image_vector('first.jpg', b'jpeg', rng.standard_normal(DIM), {'c': 1})
+    second.add_image_vector('second.jpg', b'jpeg', rng.standard_normal(DIM), {'b_c': 1})
+    conn = sqlite3.connect(path)
+    indexed = {row[0]: row[1] for row in conn.execute("SELECT tbl_name, sql FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+    assert 'meta_c' in indexed['a_b'] and 'meta_b_c' in indexed['a']
+    assert second.find_similar_images(random_image(rng), threshold=-1.0, where={'b_c': 1}).files == ['second.jpg']
+    first.close()
+    second.close()
+
+
+def test_rows_added_by_another_connection_are_found(collection, embedding_model, rng, tmp_path):
+    fill(collection, rng)
+    image = random_image(rng)
+    collection.find_similar_images(image)
+    other = Collection(
+        'test', collection.conn_str, embedding_model,
+        quantization=collection.quantization, compression=collection.compression
+    )
+    vector = embedding_model(image)
+    other.add_image_vector('query.jpg', b'jpeg', vector, {})
+    other.close()
+    result = collection.find_similar_images(image, top_N=1)
+    assert result.files == ['query.jpg']
+    np.testing.assert_allclose(result.scores, [1.0], atol=TOLERANCES[collection.quantization])
+
+
+@pytest.mark.parametrize('first', available_storages(), ids=lambda storage: f'{storage[0]}-{storage[1] or "raw"}')
+def test_mixed_storage_formats_are_searched_together(collection, first, embedding_model, rng):
+    quantization, compression = first
+    writer = Collection('test', collection.conn_str, embedding_model, quantization=quantization, compression=compression)
+    vectors = fill(writer, rng, n=100)
+    writer.close()
+    vectors = np.concatenate([vectors, fill(collection, rng, n=100, start=100)])
+    stored = collection.get_all_vectors()[2]
+    tolerance = max(TOLERANCES[quantization], TOLERANCES[collection.quantization])
+    np.testing.assert_allclose(stored, vectors, atol=tolerance)
+    image = random_image(rng)
+    result = collection.find_similar_images(image, top_N=10, threshold=-1.0)
+    files, scores, _ = reference(stored, embedding_model(image).ravel(), -1.0, 10)
+    assert result.files == files
+    np.testing.assert_allclose(result.scores, scores, atol=1e-4)
+
+
+def test_top_n_zero_returns_nothing(collection, rng):
+    fill(collection, rng)
+    result = collection.find_similar_images(random_image(rng), top_N=0, threshold=-1.0)
+    assert result.files == [] and result.scores == [] and result.metadata == []
+
+
+def test_empty_collection_returns_nothing(collection, rng):
+    result = collection.find_similar_images(random_image(rng), top_N=5, threshold=-1.0)
+    assert result.n == 0
+    assert result.files == [] and result.scores == [] and result.base64 == []
+
+
+def test_reset_collection_drops_hnsw_graph(index, embedding_model, rng, tmp_path):
+    if index != 'hnsw':
+        pytest.skip("only relevant to the HNSW index")
+    client = Client(embedding_model, persistent_path=str(tmp_path / 'test.db3'))
+    collection = client.create_collection('test', quantization='float32', index='hnsw')
+    fill(collection, rng)
+    collection.find_similar_images(random_image(rng))
+    collection.close()
+    client.reset_collection(collection)
+    vectors = fill(collection, rng, n=60)
+    image = random_image(rng)
+    result = collection.find_similar_images(image, top_N=3, threshold=-1.0)
+    files, _, _ = reference(vectors, embedding_model(image).ravel(), -1.0, 3)
+    assert result.files == files
+    collection.close()
+
+
+def test_in_memory_collection_is_shared_across_threads(embedding_model, rng):
+    collection = Collection('test', ':memory:', embedding_model, quantization='float32')
+    vectors = fill(collection, rng, n=50)
+    images = [random_image(rng) for _ in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda image: collection.find_similar_images(image, top_N=3, threshold=-1.0), images))
+    for image, result in zip(images, results):
+        assert result.files == reference(vectors, embedding_model(image).ravel(), -1.0, 3)[0]
+    # A thread asking for a connection while another one holds it waits for it
+    paths = []
+    with collection._get_connection():
+        thread = threading.Thread(target=lambda: paths.extend(collection.get_all_vectors()[1]))
+        thread.start()
+        thread.join(0.1)
+    thread.join()
+    assert paths == [f'image_{i}.jpg' for i in range(50)]
+    collection.close()
+
+
+def test_hnsw_graph_is_built_on_insert_and_restored_at_open(index, embedding_model, rng, tmp_path):
+    if index != 'hnsw':
+        pytest.skip("only relevant to the HNSW index")
+    path = str(tmp_path / 'test.db3')
+    collection = Collection('test', path, embedding_model, quantization='float32', index='hnsw')
+    fill(collection, rng)
+    # Every row is in the graph before the first query
+    assert collection._ann is not None and len(collection._ann) == N_ROWS
+    assert collection._ann_version == collection._matrix_version
+    collection.close()
+    reopened = Collection('test', path, embedding_model, quantization='float32', index='hnsw')
+    assert reopened._ann is not None and len(reopened._ann) == N_ROWS
+    reopened.close()
+
+
+def test_queries_fall_back_to_exact_search_while_the_graph_is_built(index, embedding_model, rng, tmp_path):
+    if index != 'hnsw':
+        pytest.skip("only relevant to the HNSW index")
+    collection = Collection('test', str(tmp_path / 'test.db3'), embedding_model, quantization='float32', index='hnsw')
+    vectors = fill(collection, rng)
+    collection._reset_ann()
+    image = random_image(rng)
+    with collection._ann_build_lock:
+        result = collection.find_similar_images(image, top_N=5, threshold=0.0)
+    files, _, n_findings = reference(vectors, embedding_model(image).ravel(), 0.0, 5)
+    assert result.files == files and result.n == n_findings
+    assert collection._ann is None
+    collection.find_similar_images(image)
+    assert collection._ann is not None and len(collection._ann) == N_ROWS
+    collection.close()
@@ -0,0 +1,65 @@
+import base64
+import io
+import json
+import numpy as np
+import pytest
+
+from PymvDB import server
+from PymvDB.Client import Client
+from conftest import random_image
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def app(embedding_model, tmp_path, monkeypatch):
+    """The server, with a stand-in embedding model and its collections in a temporary database."""
+    monkeypatch.setattr(server, 'embedding_model', embedding_model)
+    monkeypatch.setattr(server, 'client', Client(embedding_model, persistent_path=str(tmp_path / 'test.db3')))
+    monkeypatch.setattr(server, 'collections', {})
+    yield server.HTTPserver.test_client()
+    for collection in server.collections.values():
+        collection.close()
+
+
+def post_multipart(app, route, image_data, **fields):
+    data = {key: value if key in ('collection', 'file') else json.dumps(value) for key, value in fields.items()}
+    data['image'] = (io.BytesIO(image_data), 'image.png')
+    return app.post(route, data=data, content_type='multipart/form-data')
+
+
+def post_json(app, route, image_data, **fields):
+    return app.post(route, json={**fields, 'image_base64': base64.b64encode(image_data).decode()})
+
+
+@pytest.mark.parametrize('post', [post_multipart, post_json])
+def test_add_and_find_images(app, rng, post):
+    images = [png_bytes(random_image(rng)) for _ in range(3)]
+    for i, image_data in enumerate(images):
+        response = post(app, '/add_image', image_data, collection='test', file=f'image_{i}.png', metadata={'i': i})
+        assert response.status_code == 200
+
+    response = post(app, '/find_similar', images[1], collection='test', top_N=1, threshold=0.0)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['files'] == ['image_1.png']
+    assert base64.b64decode(result['base64'][0]) == images[1]
+    assert result['metadata'] == [{'i': 1}]
+    np.testing.assert_allclose(result['scores'], [1.0], atol=1e-2)
+
+    response = post(app, '/find_similar', images[1], collection='test', top_N=3, threshold=-1.0, where={'i': 2})
+    assert response.get_json()['files'] == ['image_2.png']
+
+
+@pytest.mark.parametrize('post', [post_multipart, post_json])
+def test_invalid_collection_name_is_rejected(app, rng, post):
+    image_data = png_bytes(random_image(rng))
+    response = post(app, '/add_image', image_data, collection='bad name', file='image.png', metadata={})
+    assert response.status_code == 400
+    response = post(app, '/find_similar', image_data, collection='bad name')
+    assert response.status_code == 400
+    assert app.post('/create_collection', json={'name': 'bad name'}).status_code == 400